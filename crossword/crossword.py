@@ -9,6 +9,7 @@ class Variable():
         self.j = j
         self.direction = direction
         self.length = length
+        self.hash = hash((self.i, self.j, self.direction, self.length))
         self.cells = []
         for k in range(self.length):
             self.cells.append(
@@ -17,7 +18,7 @@ class Variable():
             )
 
     def __hash__(self):
-        return hash((self.i, self.j, self.direction, self.length))
+        return self.hash
 
     def __eq__(self, other):
         return (
@@ -35,6 +36,114 @@ class Variable():
         return f"Variable({self.i}, {self.j}, {direction}, {self.length})"
 
 
+class Overlap():
+    __slots__ = ("variable", "i", "j")
+
+    def __init__(self, variable, i, j):
+        """
+        Create an overlap with `variable`, where the ith character of the
+        word it belongs to overlaps the jth character of `variable`.
+        """
+        self.variable = variable
+        self.i = i
+        self.j = j
+
+    def __repr__(self):
+        return f"Overlap({self.variable!r}, {self.i}, {self.j})"
+
+
+class Overlaps(dict):
+    """
+    Overlaps between pairs of variables, stored only for pairs that
+    overlap; looking up any other pair gives None.
+    """
+
+    def __missing__(self, key):
+        return None
+
+
+class WordIndex():
+
+    def __init__(self, words):
+        """
+        Index a vocabulary by word length and by (position, letter).
+
+        The words of each length are numbered in sorted order, and a set of
+        them is stored as a bitset: an int with bit k set if word k is in
+        the set. `masks[length][position][letter]` is the bitset of words
+        of that length with `letter` at `position`.
+        """
+        self.words = dict()
+        for word in sorted(words):
+            self.words.setdefault(len(word), []).append(word)
+
+        self.masks = dict()
+        for length, group in self.words.items():
+            self.masks[length] = []
+            for position in range(length):
+                bits = dict()
+                for k, word in enumerate(group):
+                    if word[position] not in bits:
+                        bits[word[position]] = bytearray((len(group) + 7) // 8)
+                    bits[word[position]][k >> 3] |= 1 << (k & 7)
+                self.masks[length].append({
+                    letter: int.from_bytes(b, "little") for letter, b in bits.items()
+                })
+
+        # Number of each word within its length
+        self.positions = {
+            word: k for group in self.words.values() for k, word in enumerate(group)
+        }
+
+    def full(self, length):
+        """Return the bitset of all words of `length`."""
+        return (1 << len(self.words.get(length, ()))) - 1
+
+    def letters(self, length, position, mask):
+        """
+        Return the letters at `position` of the words in bitset `mask` of
+        words of `length`.
+        """
+        if length not in self.masks:
+            return []
+        return [
+            letter for letter, bits in self.masks[length][position].items()
+            if bits & mask
+        ]
+
+    def support(self, length, position, letters):
+        """
+        Return the bitset of words of `length` with any of `letters` at
+        `position`.
+        """
+        if length not in self.masks:
+            return 0
+        masks = self.masks[length][position]
+        support = 0
+        for letter in letters:
+            support |= masks.get(letter, 0)
+        return support
+
+    def decode(self, length, mask):
+        """Return the words of `length` in bitset `mask`, in sorted order."""
+        group = self.words.get(length, [])
+        words = []
+        for offset, byte in enumerate(mask.to_bytes((mask.bit_length() + 7) // 8, "little")):
+            while byte:
+                low = byte & -byte
+                words.append(group[offset * 8 + low.bit_length() - 1])
+                byte ^= low
+        return words
+
+    def encode(self, length, words):
+        """Return the bitset of `words` of `length`."""
+        mask = 0
+        for word in words:
+            if len(word) == length and word in self.positions:
+                mask |= 1 << self.positions[word]
+        return mask
+
+
 class Crossword():
 
     def __init__(self, structure_file, words_file):
@@ -60,6 +169,7 @@ class Crossword():
         # Save vocabulary list
         with open(words_file) as f:
             self.words = set(f.read().upper().splitlines())
+        self.index = WordIndex(self.words)
 
         # Determine variable set
         self.variables = set()
@@ -108,26 +218,31 @@ class Crossword():
         # For any pair of variables v1, v2, their overlap is either:
         #    None, if the two variables do not overlap; or
         #    (i, j), where v1's ith character overlaps v2's jth character
-        self.overlaps = dict()
-        for v1 in self.variables:
-            for v2 in self.variables:
-                if v1 == v2:
-                    continue
-                cells1 = v1.cells
-                cells2 = v2.cells
-                intersection = set(cells1).intersection(cells2)
-                if not intersection:
-                    self.overlaps[v1, v2] = None
-                else:
-                    intersection = intersection.pop()
-                    self.overlaps[v1, v2] = (
-                        cells1.index(intersection),
-                        cells2.index(intersection)
-                    )
+        # Only overlapping pairs are stored, found from the variables
+        # covering each cell rather than by comparing every pair
+        self.overlaps = Overlaps()
+        covering = dict()
+        for variable in self.variables:
+            for k, cell in enumerate(variable.cells):
+                covering.setdefault(cell, []).append((variable, k))
+        for variables in covering.values():
+            for v1, i in variables:
+                for v2, j in variables:
+                    if v1 != v2:
+                        self.overlaps[v1, v2] = (i, j)
+
+        # Adjacency index: each variable's overlaps, and its neighbors
+        self.adjacency = {variable: [] for variable in self.variables}
+        for (v1, v2), (i, j) in self.overlaps.items():
+            self.adjacency[v1].append(Overlap(v2, i, j))
+        self.adjacency = {
+            variable: tuple(overlaps) for variable, overlaps in self.adjacency.items()
+        }
+        self.neighbor_sets = {
+            variable: frozenset(overlap.variable for overlap in overlaps)
+            for variable, overlaps in self.adjacency.items()
+        }
 
     def neighbors(self, var):
         """Given a variable, return set of overlapping variables."""
-        return set(
-            v for v in self.variables
-            if v != var and self.overlaps[v, var]
-        )
+        return self.neighbor_sets[var]
@@ -1,17 +1,56 @@
-import sys
+import argparse
+import multiprocessing
+import queue
+import random
 
 from crossword import *
 
+# Most words a domain change may add or remove for letter counts to be
+# updated word by word; larger changes recount from the word index
+HISTOGRAM_UPDATE_LIMIT = 32
+
+# Value orderings a creator can use
+VALUE_ORDERS = ["lcv", "random"]
+
+# Seconds the portfolio waits for a result before checking for dead workers
+PORTFOLIO_POLL_INTERVAL = 0.1
+
 
 class CrosswordCreator():
 
-    def __init__(self, crossword):
+    def __init__(self, crossword, seed=None, value_order="lcv"):
         """
         Create new CSP crossword generate.
+
+        If `seed` is given, ties between variables and between values are
+        broken at random. `value_order` is "lcv" for least constraining
+        values first, or "random", which also breaks ties at random even
+        without a seed.
         """
         self.crossword = crossword
+        self.index = crossword.index
+        if seed is not None or value_order == "random":
+            self.random = random.Random(seed)
+        else:
+            self.random = None
+        self.value_order = value_order
+
+        # Each domain is a bitset over the words of the variable's length
         self.domains = {
-            var: self.crossword.words.copy()
+            var: self.index.full(var.length)
+            for var in self.crossword.variables
+        }
+
+        # Previous domains, as (variable, domain) pairs, to undo changes
+        self.trail = []
+
+        # For each variable, a domain and, for each position that a neighbor
+        # overlaps, the number of words in that domain with each letter there
+        self.histograms = {
+            var: (self.domains[var], {
+                overlap.i: self.count_letters(var, overlap.i, self.domains[var])
+                for overlap in self.crossword.adjacency[var]
+            })
             for var in self.crossword.variables
         }
 
@@ -91,8 +130,66 @@ class CrosswordCreator():
         """
         self.enforce_node_consistency()
         self.ac3()
+        self.trail.clear()
         return self.backtrack(dict())
 
+    def set_domain(self, var, domain):
+        """
+        Replace the domain of `var`, recording the old one on the trail.
+        """
+        if domain != self.domains[var]:
+            self.trail.append((var, self.domains[var]))
+            self.domains[var] = domain
+
+    def undo(self, mark):
+        """
+        Restore every domain changed since the trail had length `mark`.
+        """
+        while len(self.trail) > mark:
+            var, domain = self.trail.pop()
+            self.domains[var] = domain
+
+    def count_letters(self, var, position, domain):
+        """
+        Return a dictionary mapping each letter to the number of words in
+        bitset `domain` of `var` with that letter at `position`.
+        """
+        if var.length not in self.index.masks:
+            return dict()
+        return {
+            letter: (domain & mask).bit_count()
+            for letter, mask in self.index.masks[var.length][position].items()
+        }
+
+    def letter_counts(self, var):
+        """
+        Return the letter counts of the current domain of `var` at each
+        position a neighbor overlaps, updating them from the domain they
+        were last counted for.
+        """
+        old, histograms = self.histograms[var]
+        new = self.domains[var]
+        if old == new:
+            return histograms
+        self.histograms[var] = (new, histograms)
+
+        changed = old ^ new
+        if changed.bit_count() > HISTOGRAM_UPDATE_LIMIT:
+            for position in histograms:
+                histograms[position] = self.count_letters(var, position, new)
+            return histograms
+
+        # Few words changed: count each of them in or out
+        group = self.index.words[var.length]
+        while changed:
+            low = changed & -changed
+            word = group[low.bit_length() - 1]
+            step = 1 if new & low else -1
+            for position, counts in histograms.items():
+                counts[word[position]] += step
+            changed ^= low
+        return histograms
+
     def enforce_node_consistency(self):
         """
         Update `self.domains` such that each variable is node-consistent.
@@ -100,9 +197,10 @@ class CrosswordCreator():
          constraints; in this case, the length of the word.)
         """
         for variable in self.crossword.variables:
-            # Filter valid words
-            valid_words = {word for word in self.crossword.words if len(word)==variable.length}
-            self.domains[variable] = valid_words # Update variable domain
+            # Domains only hold words of the right length already
+            self.set_domain(
+                variable, self.domains[variable] & self.index.full(variable.length)
+            )
 
     
 
@@ -121,16 +219,13 @@ class CrosswordCreator():
         if self.crossword.overlaps[x,y]: 
             x_index = self.crossword.overlaps[x,y][0]
             y_index = self.crossword.overlaps[x,y][1]
-            
-            for xword in self.domains[x].copy():
-                match = False
-                for yword in self.domains[y]:
-                    if xword[x_index] == yword[y_index]:
-                        match = True 
-                        break
-                if not match: # Remove words that had no match with words in the y-domain.
-                    self.domains[x].remove(xword)
-                    madeRevision = True
+
+            # Keep the x-words whose overlapping letter some y-word supplies
+            letters = self.index.letters(y.length, y_index, self.domains[y])
+            revised = self.domains[x] & self.index.support(x.length, x_index, letters)
+            if revised != self.domains[x]:
+                self.set_domain(x, revised)
+                madeRevision = True
 
         return madeRevision
 
@@ -157,11 +252,12 @@ class CrosswordCreator():
             #print(type(result))  # Print the type to confirm it's a tuple
             x, y = result
             if self.revise(x,y):
-                if len(self.domains[x]) == 0:
+                if self.domains[x] == 0:
                     return False # Unsolvable 
                 # Add related arcs (neighbors) to queues 
-                for z in self.crossword.neighbors(x) - {y}:
-                    queue.append((z,x))
+                for overlap in self.crossword.adjacency[x]:
+                    if overlap.variable != y:
+                        queue.append((overlap.variable, x))
         return True
 
     def assignment_complete(self, assignment):
@@ -169,28 +265,37 @@ class CrosswordCreator():
         Return True if `assignment` is complete (i.e., assigns a value to each
         crossword variable); return False otherwise.
         """
-        for variable in self.crossword.variables:
-            if variable not in assignment:
-                return False
-
-        return True
+        return len(assignment) == len(self.crossword.variables)
 
-    def consistent(self, assignment):
+    def consistent(self, assignment, var=None):
         """
         Return True if `assignment` is consistent (i.e., words fit in crossword
         puzzle without conflicting characters); return False otherwise.
+
+        If `var` is given, the rest of `assignment` is known to be consistent
+        and only the value of `var` is checked.
         """
+        if var is not None:
+            val = assignment[var]
+            if var.length != len(val):
+                return False
+            for overlap in self.crossword.adjacency[var]:
+                if overlap.variable in assignment:
+                    if val[overlap.i] != assignment[overlap.variable][overlap.j]:
+                        return False
+            return all(
+                assignment[other] != val for other in assignment if other != var
+            )
+
         for var in assignment:
             val = assignment[var]
 
             if var.length!=len(val): # Check for correct length
                 return False 
-            for y in self.crossword.neighbors(var): # Check for overlaps
-                if y in assignment:
-                    val_y = assignment[y]
-                    x_index = self.crossword.overlaps[var,y][0]
-                    y_index = self.crossword.overlaps[var,y][1]
-                    if val[x_index] != val_y[y_index]:
+            for overlap in self.crossword.adjacency[var]: # Check for overlaps
+                if overlap.variable in assignment:
+                    val_y = assignment[overlap.variable]
+                    if val[overlap.i] != val_y[overlap.j]:
                         return False 
                 
         # Check for duplicates
@@ -208,20 +313,35 @@ class CrosswordCreator():
         The first value in the list, for example, should be the one
         that rules out the fewest values among the neighbors of `var`.
         """
-        constraint_cost = {} #n
+        # For each unassigned neighbor, the overlapping position in `var`,
+        # the neighbor's letter counts there, and its domain size
+        tables = [
+            (overlap.i,
+             self.letter_counts(overlap.variable)[overlap.j],
+             self.domains[overlap.variable].bit_count())
+            for overlap in self.crossword.adjacency[var]
+            if overlap.variable not in assignment
+        ]
 
-        for value in self.domains[var]:
-            constraint_cost[value] = 0 # Give every value a constraint cost
-            for y in self.crossword.neighbors(var): # Check neighbors
-                x_index = self.crossword.overlaps[var,y][0]
-                y_index = self.crossword.overlaps[var,y][1]
-                for option in self.domains[y]:
-                    if value[x_index] != option[y_index]: # If a neighboring choic is eliminated
-                        constraint_cost[value] += 1 # Increase the constraint cost
+        values = self.index.decode(var.length, self.domains[var])
+        if self.value_order == "random":
+            self.random.shuffle(values)
+            return values
 
+        # Options in a neighbor's domain without the same letter are eliminated
+        constraint_cost = {}
+        for value in values:
+            constraint_cost[value] = sum(
+                size - counts.get(value[i], 0) for i, counts, size in tables
+            )
 
         # Create ordered list
-        ordered_list = sorted(constraint_cost, key=lambda item: item[1]) 
+        if self.random:
+            ordered_list = sorted(
+                constraint_cost, key=lambda value: (constraint_cost[value], self.random.random())
+            )
+        else:
+            ordered_list = sorted(constraint_cost, key=constraint_cost.get)
 
         return ordered_list
     
@@ -234,14 +354,18 @@ class CrosswordCreator():
         return values.
         """
 
-        min_remaining = 1000
-        for var in self.crossword.variables:
+        variables = list(self.crossword.variables)
+        if self.random:
+            self.random.shuffle(variables)
+
+        min_remaining = float("inf")
+        for var in variables:
             if var not in assignment:
-                if len(self.domains[var])<min_remaining:
-                    min_remaining = len(self.domains[var])
+                if self.domains[var].bit_count()<min_remaining:
+                    min_remaining = self.domains[var].bit_count()
                     current_min = var
-                elif len(self.domains[var])==min_remaining: # Tied minimum
-                    current_min = var if len(self.crossword.neighbors(var))>=len(self.crossword.neighbors(current_min)) else current_min
+                elif self.domains[var].bit_count()==min_remaining: # Tied minimum
+                    current_min = var if len(self.crossword.adjacency[var])>=len(self.crossword.adjacency[current_min]) else current_min
 
         
         return current_min
@@ -256,55 +380,153 @@ class CrosswordCreator():
         `assignment` is a mapping from variables (keys) to words (values).
 
         If no assignment is possible, return None.
+
+        After each assignment, arc consistency is maintained from the newly
+        assigned variable, and its word is removed from the other domains of
+        the same length. Domain changes are recorded on `self.trail` and
+        undone when a value fails, instead of copying the domains.
         """
-        
 
         # Check if the assignment is already complete
         if self.assignment_complete(assignment):
-            return assignment 
-        
-        # Variable selection
-        next_var = self.select_unassigned_variable(assignment)
-
-        # Order domain values according to least constraining heuristic
-        ordered_list = self.order_domain_values(next_var, assignment)
-        if not ordered_list:
-            return None
-
-        # Create copy of assignment and trial least constraining domain value
-        new_assignment = assignment.copy()
-        new_assignment[next_var] = ordered_list[0]
+            return assignment
 
-        # Recursively call backtrack 
-        if self.consistent(new_assignment):
-            return self.backtrack(new_assignment)
+        # Variable selection
+        var = self.select_unassigned_variable(assignment)
+
+        # Try values in order of the least constraining value heuristic
+        for value in self.order_domain_values(var, assignment):
+            assignment[var] = value
+            if self.consistent(assignment, var):
+                mark = len(self.trail)
+                if self.infer(var, value, assignment):
+                    result = self.backtrack(assignment)
+                    if result is not None:
+                        return result
+                self.undo(mark)
+            del assignment[var]
 
         return None
 
+    def infer(self, var, value, assignment):
+        """
+        Reduce the domain of `var` to `value`, remove `value` from the other
+        unassigned domains of the same length, and enforce arc consistency
+        towards every changed domain. Return False if a domain becomes empty.
+        """
+        bit = 1 << self.index.positions[value]
+        self.set_domain(var, bit)
+        changed = [var]
+        for other in self.crossword.variables:
+            if other.length == var.length and other not in assignment and self.domains[other] & bit:
+                self.set_domain(other, self.domains[other] & ~bit)
+                if self.domains[other] == 0:
+                    return False
+                changed.append(other)
+
+        return self.ac3([
+            (overlap.variable, y) for y in changed for overlap in self.crossword.adjacency[y]
+            if overlap.variable not in assignment
+        ])
+
+
+def solve_portfolio(crossword, workers, seed=0):
+    """
+    Solve `crossword` with `workers` creators in separate processes and
+    return the first complete assignment found, or None if none exists.
+
+    Worker 0 runs the default search. The others break ties at random with
+    their own seeds, alternating between the value orders in VALUE_ORDERS.
+    Workers are forked, so they share the parent's crossword and word index
+    instead of copying them. Once a solution arrives, the rest are stopped.
+    A worker that dies without reporting, e.g. when it is killed, counts
+    as a failed search.
+    """
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return CrosswordCreator(crossword).solve()
+
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=portfolio_worker, args=(crossword, worker, seed, results), daemon=True
+        )
+        for worker in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    # Wait for a solution, or for every worker to fail or die
+    assignment = None
+    finished = set()
+    try:
+        while len(finished) < workers:
+            try:
+                worker, assignment = results.get(timeout=PORTFOLIO_POLL_INTERVAL)
+            except queue.Empty:
+                # Workers that exit cleanly always report, so only count crashes
+                finished.update(
+                    worker for worker, process in enumerate(processes)
+                    if process.exitcode not in (None, 0)
+                )
+                continue
+            if assignment is not None:
+                break
+            finished.add(worker)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+    return assignment
+
+
+def portfolio_worker(crossword, worker, seed, results):
+    """
+    Solve `crossword` with the heuristics of portfolio `worker` and put
+    `(worker, assignment)` on the `results` queue, with None if it failed.
+    """
+    if worker == 0:
+        creator = CrosswordCreator(crossword)
+    else:
+        value_order = VALUE_ORDERS[(worker - 1) % len(VALUE_ORDERS)]
+        creator = CrosswordCreator(crossword, seed + worker, value_order)
 
-def main():
+    assignment = None
+    try:
+        assignment = creator.solve()
+    finally:
+        results.put((worker, assignment))
 
-    # Check usage
-    if len(sys.argv) not in [3, 4]:
-        sys.exit("Usage: python generate.py structure words [output]")
 
-    # Parse command-line arguments
-    structure = sys.argv[1]
-    words = sys.argv[2]
-    output = sys.argv[3] if len(sys.argv) == 4 else None
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a crossword puzzle from a structure and a word list."
+    )
+    parser.add_argument("structure")
+    parser.add_argument("words")
+    parser.add_argument("output", nargs="?", default=None)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="solve with a portfolio of this many processes")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="base seed for the portfolio's random tie-breaking")
+    args = parser.parse_args()
 
     # Generate crossword
-    crossword = Crossword(structure, words)
+    crossword = Crossword(args.structure, args.words)
     creator = CrosswordCreator(crossword)
-    assignment = creator.solve()
+    if args.workers > 1:
+        assignment = solve_portfolio(crossword, args.workers, args.seed)
+    else:
+        assignment = creator.solve()
 
     # Print result
     if assignment is None:
         print("No solution.")
     else:
         creator.print(assignment)
-        if output:
-            creator.save(assignment, output)
+        if args.output:
+            creator.save(assignment, args.output)
 
 
 if __name__ == "__main__":
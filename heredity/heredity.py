@@ -1,6 +1,17 @@
+import argparse
 import csv
+import heapq
 import itertools
+import json
+import math
+import os
 import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
 
 PROBS = {
 
@@ -36,62 +47,166 @@ PROBS = {
     "mutation": 0.01
 }
 
+# Number of assignments evaluated together by `batch_probabilities`
+BATCH_SIZE = 1 << 16
+
+# Default budget and chunking for the Monte Carlo methods
+SAMPLES = 100000
+ROUND_SIZE = 1000
+GIBBS_CHAINS = 100
+GIBBS_BURN_IN = 50
+
+# Families handed to each batch worker at a time, chunks in flight per
+# worker, and results kept per worker
+BATCH_CHUNK = 16
+BATCH_WINDOW = 4
+RESULT_CACHE_SIZE = 4096
+
 
 def main():
 
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
-    people = load_data(sys.argv[1])
+    parser = argparse.ArgumentParser(usage="python heredity.py data.csv [--method METHOD]")
+    parser.add_argument("data")
+    parser.add_argument("--batch", action="store_true",
+                        help="data is a directory of CSVs or a JSONL file of families (- for stdin)")
+    parser.add_argument("--output", default="-",
+                        help="JSONL file for batch results (default stdout)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes for batch mode")
+    parser.add_argument("--method", choices=list(METHODS) + list(SAMPLERS),
+                        default="elimination")
+    parser.add_argument("--samples", type=int, default=None,
+                        help=f"sample budget for sampling methods (default {SAMPLES})")
+    parser.add_argument("--seconds", type=float, default=None,
+                        help="time budget for sampling methods")
+    parser.add_argument("--chains", type=int, default=None,
+                        help="independent sampling processes")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    if args.batch:
+        if args.method not in METHODS:
+            parser.error("batch mode needs an exact method")
+        if args.output == "-":
+            run_batch(args.data, sys.stdout, args.method, args.workers)
+        else:
+            with open(args.output, "w") as output:
+                run_batch(args.data, output, args.method, args.workers)
+        return
+    people = load_data(args.data)
+    names = list(people)
 
-    # Keep track of gene and trait probabilities for each person
-    probabilities = {
-        person: {
+    # Compute gene and trait probabilities for each person
+    errors = None
+    if args.method in SAMPLERS:
+        genes, traits, gene_errors, trait_errors = monte_carlo_probabilities(
+            people, args.method, args.samples, args.seconds, args.chains, args.seed
+        )
+        errors = as_dictionary(names, gene_errors, trait_errors)
+    else:
+        genes, traits = METHODS[args.method](people)
+    probabilities = as_dictionary(names, genes, traits)
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                if errors:
+                    print(f"    {value}: {p:.4f} ± {errors[person][field][value]:.4f}")
+                else:
+                    print(f"    {value}: {p:.4f}")
+
+
+def as_dictionary(names, genes, traits):
+    """
+    Return the gene and trait distributions of each person in `names` as
+    a dictionary in the format printed by `main`, given a (people, 3)
+    array `genes` over 0, 1 and 2 copies and a (people, 2) array `traits`
+    over False and True.
+    """
+    return {
+        name: {
             "gene": {
-                2: 0,
-                1: 0,
-                0: 0
+                2: float(genes[i, 2]),
+                1: float(genes[i, 1]),
+                0: float(genes[i, 0])
             },
             "trait": {
-                True: 0,
-                False: 0
+                True: float(traits[i, 1]),
+                False: float(traits[i, 0])
             }
         }
-        for person in people
+        for i, name in enumerate(names)
     }
 
-    # Loop over all sets of people who might have the trait
-    names = set(people)
-    for have_trait in powerset(names):
 
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
+def log_sum_exp(table, axis=None):
+    """
+    Return log(sum(exp(table))) over `axis`, shifting by the largest value
+    so that tiny probabilities do not underflow.
+    """
+    peak = np.max(table, axis=axis, keepdims=True)
+    peak = np.where(np.isfinite(peak), peak, 0)
+    with np.errstate(divide="ignore"):
+        total = np.log(np.exp(table - peak).sum(axis=axis, keepdims=True)) + peak
+    return total.squeeze(axis=axis)
 
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            for two_genes in powerset(names - one_gene):
 
-                # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+def from_log(table):
+    """
+    Return the distributions along the last axis of a table of
+    unnormalized log-probabilities, as probabilities summing to 1.
+    """
+    return np.exp(table - log_sum_exp(table, axis=-1)[..., np.newaxis])
 
-    # Ensure probabilities sum to 1
-    normalize(probabilities)
 
-    # Print results
-    for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+def log_table(table):
+    """
+    Return the natural log of an array of probabilities, with -inf for 0.
+    """
+    with np.errstate(divide="ignore"):
+        return np.log(table)
+
+
+def enumerate_probabilities(people):
+    """
+    Return gene and trait distributions for each person by summing the
+    joint probability of every assignment of genes and traits.
+
+    Each joint probability is added as a plain float relative to the
+    largest log-probability seen so far, so that tiny probabilities do not
+    underflow; totals are rescaled whenever a larger one is found. The
+    result is a pair of (people, 3) and (people, 2) arrays, like those
+    returned by `eliminate_probabilities`.
+    """
+
+    # Keep track of gene and trait probabilities for each person
+    gene_totals = [[0.0] * 3 for person in people]
+    trait_totals = [[0.0] * 2 for person in people]
+    peak = -math.inf
+
+    # Loop over every assignment consistent with known information
+    for genes, traits, log_p in assignments(people):
+        if log_p > peak:
+            scale = math.exp(peak - log_p)
+            for totals in gene_totals + trait_totals:
+                for value in range(len(totals)):
+                    totals[value] *= scale
+            peak = log_p
+        p = math.exp(log_p - peak)
+        for totals, value in zip(gene_totals, genes):
+            totals[value] += p
+        for totals, value in zip(trait_totals, traits):
+            totals[value] += p
+
+    # Ensure probabilities sum to 1
+    gene_totals = np.array(gene_totals)
+    trait_totals = np.array(trait_totals)
+    return (gene_totals / gene_totals.sum(axis=1, keepdims=True),
+            trait_totals / trait_totals.sum(axis=1, keepdims=True))
 
 
 def load_data(filename):
@@ -101,18 +216,27 @@ def load_data(filename):
     mother, father must both be blank, or both be valid names in the CSV.
     trait should be 0 or 1 if trait is known, blank otherwise.
     """
-    data = dict()
     with open(filename) as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            name = row["name"]
-            data[name] = {
-                "name": name,
-                "mother": row["mother"] or None,
-                "father": row["father"] or None,
-                "trait": (True if row["trait"] == "1" else
-                          False if row["trait"] == "0" else None)
-            }
+        return read_people(csv.DictReader(f))
+
+
+def read_people(rows):
+    """
+    Return a dictionary of people from rows with fields name, mother,
+    father, trait, as read by `load_data`. trait may also be a number, a
+    boolean or None, as found in JSON.
+    """
+    data = dict()
+    for row in rows:
+        name = row["name"]
+        trait = row.get("trait")
+        data[name] = {
+            "name": name,
+            "mother": row["mother"] or None,
+            "father": row["father"] or None,
+            "trait": (True if trait in ("1", 1) else
+                      False if trait in ("0", 0) else None)
+        }
     return data
 
 
@@ -128,6 +252,79 @@ def powerset(s):
     ]
 
 
+def ancestral_order(people):
+    """
+    Return a list of the names in `people` in which every person comes
+    after their parents.
+    """
+    order = []
+    placed = set()
+
+    def place(name):
+        if name and name not in placed:
+            placed.add(name)
+            place(people[name]["mother"])
+            place(people[name]["father"])
+            order.append(name)
+
+    for name in people:
+        place(name)
+    return order
+
+
+def assignments(people):
+    """
+    Lazily generate every assignment of genes and traits that agrees with
+    the known traits in `people`, as tuples `(genes, traits, log_p)`.
+    `genes` and `traits` list each person's gene count and trait (as 0
+    or 1) in the order of `people`, and `log_p` is the log of the joint
+    probability that `joint_probability` would return for the assignment.
+
+    Assignments are built one person at a time, parents before children,
+    adding each person's log-probability as they are assigned. Known
+    traits are fixed rather than enumerated, and a partial assignment
+    whose probability is already 0 is not extended. Only the assignment
+    in progress is kept in memory.
+    """
+    index = {name: i for i, name in enumerate(people)}
+    order = ancestral_order(people)
+    inheritance = log_table(inheritance_table()).tolist()
+    prior = log_table(np.array([PROBS["gene"][g] for g in range(3)])).tolist()
+    trait_table = log_table(np.array([
+        [PROBS["trait"][g][t] for t in (False, True)] for g in range(3)
+    ])).tolist()
+    genes = [0] * len(order)
+    traits = [0] * len(order)
+
+    def extend(position, log_p):
+        if log_p == -math.inf:
+            return
+        if position == len(order):
+            yield list(genes), list(traits), log_p
+            return
+
+        person = order[position]
+        i = index[person]
+        mother = people[person]["mother"]
+        father = people[person]["father"]
+        trait = people[person]["trait"]
+        for person_genes in (2, 1, 0):
+            if not mother and not father:
+                gene_log_p = prior[person_genes]
+            else:
+                gene_log_p = inheritance[genes[index[mother]]][genes[index[father]]][person_genes]
+
+            genes[i] = person_genes
+            for person_trait in ((1, 0) if trait is None else (int(trait),)):
+                traits[i] = person_trait
+                yield from extend(
+                    position + 1,
+                    log_p + gene_log_p + trait_table[person_genes][person_trait]
+                )
+
+    yield from extend(0, 0.0)
+
+
 def joint_probability(people, one_gene, two_genes, have_trait):
     """
     Compute and return a joint probability.
@@ -200,6 +397,637 @@ def normalize(probabilities):
         probabilities[person]['trait'] = { trait: (prob / trait_total) for trait, prob in probabilities[person]['trait'].items()}
         
 
+@lru_cache(maxsize=None)
+def inheritance_table():
+    """
+    Return an array where entry [m, f, c] is the probability that a child
+    has c copies of the gene, given that their mother has m copies and
+    their father has f copies. The array is shared and read-only.
+    """
+    # Probability that a parent with 0, 1 or 2 copies passes the gene on
+    passing = [PROBS["mutation"], 0.5, 1 - PROBS["mutation"]]
+
+    table = np.zeros((3, 3, 3))
+    for mother, father in itertools.product(range(3), repeat=2):
+        mother_prob, father_prob = passing[mother], passing[father]
+        table[mother, father] = [
+            (1 - mother_prob) * (1 - father_prob),
+            (1 - mother_prob) * father_prob + (1 - father_prob) * mother_prob,
+            mother_prob * father_prob
+        ]
+    table.flags.writeable = False
+    return table
+
+
+@lru_cache(maxsize=None)
+def person_factor(trait, founder):
+    """
+    Return the shared, read-only log table of a person's factor given
+    their known `trait` (or None): over their gene count if they are a
+    `founder`, otherwise over their mother's, father's and own gene counts.
+    """
+    evidence = np.ones(3)
+    if trait is not None:
+        evidence = np.array([PROBS["trait"][genes][trait] for genes in range(3)])
+
+    if founder:
+        table = np.array([PROBS["gene"][genes] for genes in range(3)]) * evidence
+    else:
+        table = inheritance_table() * evidence
+    table = log_table(table)
+    table.flags.writeable = False
+    return table
+
+
+def family_factors(people, names):
+    """
+    Return one factor per person in `names` for the family in `people`.
+
+    A factor is a tuple `(scope, table)`, where `scope` is a tuple of
+    indexes into `names` and `table` has one axis of length 3 (gene count)
+    per variable in the scope. Each person's factor is the log-probability
+    of their gene count (given their parents' gene counts, if known), plus
+    the log-probability of their trait if it is known.
+    """
+    index = {name: i for i, name in enumerate(names)}
+    factors = []
+    for i, name in enumerate(names):
+        person = people[name]
+        founder = not person["mother"] and not person["father"]
+        if founder:
+            scope = (i,)
+        else:
+            scope = (index[person["mother"]], index[person["father"]], i)
+        factors.append((scope, person_factor(person["trait"], founder)))
+    return factors
+
+
+def align(factor, scope):
+    """
+    Return the table of `factor` with its axes reordered and expanded so
+    that it broadcasts against a table over the variables in `scope`.
+    """
+    factor_scope, table = factor
+    order = sorted(range(len(factor_scope)), key=lambda axis: scope.index(factor_scope[axis]))
+    shape = [3 if variable in factor_scope else 1 for variable in scope]
+    return table.transpose(order).reshape(shape)
+
+
+def factor_product(factors):
+    """
+    Return the product of `factors` as a factor over the union of their
+    scopes. Tables hold log-probabilities, so they are added.
+    """
+    scope = tuple(sorted(set().union(*(factor[0] for factor in factors))))
+    table = np.zeros((3,) * len(scope))
+    for factor in factors:
+        table = table + align(factor, scope)
+    return scope, table
+
+
+def marginalize(factor, keep):
+    """
+    Return `factor` with every variable not in `keep` summed out, using
+    log-sum-exp over the log-probability table.
+    """
+    scope, table = factor
+    axes = tuple(axis for axis, variable in enumerate(scope) if variable not in keep)
+    return tuple(variable for variable in scope if variable in keep), log_sum_exp(table, axes)
+
+
+def eliminate_probabilities(people):
+    """
+    Return gene and trait distributions for each person by exact inference
+    on a clique tree built by variable elimination.
+
+    People are eliminated in min-neighbors order. Each elimination step
+    becomes a clique whose outgoing message is the factor it produces, so
+    the elimination itself is the upward pass; a downward pass then sends
+    messages back, after which every person's gene distribution is read
+    from the clique that eliminated them. For tree-shaped families the
+    cliques stay small, so the cost grows linearly with family size.
+    Messages are kept in log-space, so large families do not underflow.
+    """
+    names = list(people)
+    factors = family_factors(people, names)
+
+    # Interaction graph between people who share a factor
+    neighbors = {i: set() for i in range(len(names))}
+    holding = {i: set() for i in range(len(names))} # Factor ids by variable
+    for factor_id, (scope, _) in enumerate(factors):
+        for variable in scope:
+            neighbors[variable].update(scope)
+            holding[variable].add(factor_id)
+    for variable in neighbors:
+        neighbors[variable].discard(variable)
+
+    cliques = []
+    available = dict(enumerate(factors)) # Factor id -> factor not yet used
+    origin = {} # Factor id -> clique that sent it as a message
+    heap = [(len(neighbors[variable]), variable) for variable in neighbors]
+    heapq.heapify(heap)
+    eliminated = set()
+
+    # Upward pass: eliminate people one at a time
+    while heap:
+        degree, variable = heapq.heappop(heap)
+        if variable in eliminated or degree != len(neighbors[variable]):
+            continue
+        eliminated.add(variable)
+
+        involved = holding[variable]
+        potential = factor_product([
+            available[factor_id] for factor_id in involved if factor_id not in origin
+        ])
+        children = [origin[factor_id] for factor_id in involved if factor_id in origin]
+        belief = factor_product([potential] + [cliques[child]["up"] for child in children])
+        message = marginalize(belief, set(belief[0]) - {variable})
+
+        clique = len(cliques)
+        cliques.append({
+            "variable": variable,
+            "potential": potential,
+            "children": children,
+            "parent": None,
+            "up": message
+        })
+        for child in children:
+            cliques[child]["parent"] = clique
+
+        # Replace the used factors with the new message
+        message_id = len(factors) + clique
+        available[message_id] = message
+        origin[message_id] = clique
+        for factor_id in involved:
+            for other in available.pop(factor_id)[0]:
+                if other != variable:
+                    holding[other].discard(factor_id)
+        for other in message[0]:
+            holding[other].add(message_id)
+            neighbors[other].discard(variable)
+            neighbors[other].update(set(message[0]) - {other})
+            heapq.heappush(heap, (len(neighbors[other]), other))
+
+    # Downward pass: parents are created after their children
+    genes = np.zeros((len(names), 3))
+    for clique in reversed(cliques):
+        incoming = [clique["potential"]]
+        if clique["parent"] is not None:
+            incoming.append(clique["down"])
+        incoming.extend(cliques[child]["up"] for child in clique["children"])
+
+        for position, child in enumerate(clique["children"]):
+            others = incoming[:len(incoming) - len(clique["children"])] + [
+                cliques[other]["up"]
+                for other in clique["children"][:position] + clique["children"][position + 1:]
+            ]
+            cliques[child]["down"] = marginalize(
+                factor_product(others), set(cliques[child]["up"][0])
+            )
+
+        _, table = marginalize(factor_product(incoming), {clique["variable"]})
+        genes[clique["variable"]] = from_log(table)
+
+    return genes, trait_distributions(people, names, genes)
+
+
+def trait_distributions(people, names, genes):
+    """
+    Return a (people, 2) array of each person's trait distribution: their
+    known trait if there is one, otherwise the trait probability implied
+    by their (people, 3) gene distribution in `genes`.
+    """
+    trait_table = np.array([[PROBS["trait"][g][t] for t in (False, True)] for g in range(3)])
+    traits = genes @ trait_table
+    for i, name in enumerate(names):
+        if people[name]["trait"] is not None:
+            traits[i] = [0, 0]
+            traits[i, int(people[name]["trait"])] = 1
+    return traits
+
+
+def parent_indexes(people, names):
+    """
+    Return arrays of each person's mother and father as indexes into
+    `names`, and a boolean mask of people whose parents are unknown.
+    Unknown parents are given index 0 and must be masked out by the caller.
+    """
+    index = {name: i for i, name in enumerate(names)}
+    mothers = np.array([index.get(people[name]["mother"], 0) for name in names])
+    fathers = np.array([index.get(people[name]["father"], 0) for name in names])
+    founders = np.array([
+        not people[name]["mother"] and not people[name]["father"] for name in names
+    ])
+    return mothers, fathers, founders
+
+
+def joint_log_probabilities(people, names, genes, traits):
+    """
+    Compute and return the log joint probability of many assignments.
+
+    `genes` and `traits` are arrays of shape (batch, people): entry [b, i]
+    is the number of copies of the gene (0, 1 or 2) and whether the trait
+    is present (0 or 1) for person `names[i]` in assignment b. Return an
+    array with the log of the joint probability of each assignment, as
+    `joint_probability` would compute it, using lookups into precomputed
+    log tables of PROBS.
+    """
+    mothers, fathers, founders = parent_indexes(people, names)
+    prior = log_table(np.array([PROBS["gene"][g] for g in range(3)]))
+    inheritance = log_table(inheritance_table())
+    trait_table = log_table(np.array([
+        [PROBS["trait"][g][t] for t in (False, True)] for g in range(3)
+    ]))
+
+    children = ~founders
+    person_log_p = trait_table[genes, traits]
+    person_log_p[:, founders] += prior[genes[:, founders]]
+    person_log_p[:, children] += inheritance[
+        genes[:, mothers[children]], genes[:, fathers[children]], genes[:, children]
+    ]
+    return person_log_p.sum(axis=1)
+
+
+def batch_probabilities(people):
+    """
+    Return gene and trait distributions for each person by enumerating
+    every assignment consistent with the known traits, `BATCH_SIZE`
+    assignments at a time.
+
+    Assignment number k encodes each person's gene count as a base-3 digit
+    of k, followed by one bit per person whose trait is unknown. Each
+    batch is summed relative to its most likely assignment and added to
+    the running totals with log-sum-exp, so the totals cannot underflow.
+    """
+    names = list(people)
+    unknown = [i for i, name in enumerate(names) if people[name]["trait"] is None]
+    known_traits = np.array([bool(people[name]["trait"]) for name in names], dtype=np.int64)
+    gene_place = 3 ** np.arange(len(names))
+    total = 3 ** len(names) * 2 ** len(unknown)
+
+    gene_totals = np.full((len(names), 3), -np.inf)
+    trait_totals = np.full((len(names), 2), -np.inf)
+    rows = np.arange(len(names))
+    for start in range(0, total, BATCH_SIZE):
+        codes = np.arange(start, min(start + BATCH_SIZE, total), dtype=np.int64)
+
+        # Decode each assignment number into gene counts and traits
+        genes = codes[:, np.newaxis] // gene_place % 3
+        traits = np.tile(known_traits, (len(codes), 1))
+        trait_codes = codes // 3 ** len(names)
+        for bit, i in enumerate(unknown):
+            traits[:, i] = trait_codes >> bit & 1
+
+        # Add each joint probability to the matching distributions
+        log_p = joint_log_probabilities(people, names, genes, traits)
+        peak = log_p.max()
+        if peak == -np.inf:
+            continue
+        p = np.repeat(np.exp(log_p - peak), len(names))
+        gene_totals = np.logaddexp(gene_totals, peak + log_table(np.bincount(
+            (rows * 3 + genes).ravel(), weights=p, minlength=gene_totals.size
+        ).reshape(gene_totals.shape)))
+        trait_totals = np.logaddexp(trait_totals, peak + log_table(np.bincount(
+            (rows * 2 + traits).ravel(), weights=p, minlength=trait_totals.size
+        ).reshape(trait_totals.shape)))
+
+    # Ensure probabilities sum to 1
+    return from_log(gene_totals), from_log(trait_totals)
+
+
+def family_tables(people, names):
+    """
+    Return the lookup tables the samplers share: PROBS as arrays, parent
+    indexes, and each person's known-trait log-likelihood over gene counts
+    (all zeros where the trait is unknown).
+    """
+    prior = np.array([PROBS["gene"][g] for g in range(3)])
+    trait_table = np.array([[PROBS["trait"][g][t] for t in (False, True)] for g in range(3)])
+    evidence = np.zeros((len(names), 3))
+    for i, name in enumerate(names):
+        if people[name]["trait"] is not None:
+            evidence[i] = log_table(trait_table[:, int(people[name]["trait"])])
+    return prior, inheritance_table(), trait_table, evidence, parent_indexes(people, names)
+
+
+def sample_genes(log_probabilities, rng):
+    """
+    Return one gene count per row of `log_probabilities`, an array of
+    shape (batch, 3) of unnormalized log-probabilities of 0, 1 and 2 copies.
+    """
+    cumulative = from_log(log_probabilities).cumsum(axis=1)
+    threshold = rng.random(len(log_probabilities)) * cumulative[:, -1]
+    return (threshold[:, np.newaxis] >= cumulative[:, :2]).sum(axis=1)
+
+
+def likelihood_weighting(people, names, samples, seconds, rng):
+    """
+    Estimate gene and trait distributions by likelihood weighting.
+
+    Rounds of `ROUND_SIZE` families are sampled from PROBS, parents before
+    children, and each is weighted by the probability of the known traits,
+    until `samples` families were drawn or `seconds` have passed. Weights
+    are computed as log-likelihoods and the totals are rescaled whenever a
+    larger weight appears, so long pedigrees do not underflow. Return a
+    tuple `(genes, traits, drawn)` with (people, 3) and (people, 2) arrays
+    of estimated probabilities and the number of samples drawn.
+    """
+    prior, inheritance, trait_table, evidence, (mothers, fathers, founders) = family_tables(people, names)
+    inheritance = log_table(inheritance)
+    order = [names.index(name) for name in ancestral_order(people)]
+    rows = np.arange(len(names))
+    traits = known_traits(people, names)
+
+    gene_totals = np.zeros((len(names), 3))
+    trait_totals = np.zeros((len(names), 2))
+    scale = -np.inf # Log of the factor all totals are divided by
+    drawn = 0
+    start = time.perf_counter()
+    while budget_left(drawn, samples, start, seconds):
+        genes = np.zeros((ROUND_SIZE, len(names)), dtype=np.int64)
+        for i in order:
+            if founders[i]:
+                genes[:, i] = rng.choice(3, size=ROUND_SIZE, p=prior)
+            else:
+                genes[:, i] = sample_genes(
+                    inheritance[genes[:, mothers[i]], genes[:, fathers[i]]], rng
+                )
+        log_weights = evidence[rows, genes].sum(axis=1)
+        if log_weights.max() > scale:
+            rescale = np.exp(scale - log_weights.max())
+            gene_totals *= rescale
+            trait_totals *= rescale
+            scale = log_weights.max()
+        weights = np.exp(log_weights - scale)
+
+        # Average unknown traits over their distribution instead of sampling them
+        for g in range(3):
+            gene_totals[:, g] += weights @ (genes == g)
+        trait_totals[:, 1] += weights @ np.where(
+            np.isnan(traits), trait_table[genes, 1], traits
+        )
+        drawn += ROUND_SIZE
+
+    total = gene_totals.sum(axis=1, keepdims=True)
+    trait_totals[:, 0] = total[:, 0] - trait_totals[:, 1]
+    return gene_totals / total, trait_totals / total, drawn
+
+
+def gibbs_sampling(people, names, samples, seconds, rng):
+    """
+    Estimate gene and trait distributions by Gibbs sampling over gene
+    counts, with known traits held fixed as evidence.
+
+    `GIBBS_CHAINS` chains are advanced together. Each sweep resamples
+    every person's gene count given their parents, their children and
+    their children's other parents, and every sweep after the first
+    `GIBBS_BURN_IN` is counted, until `samples` states were counted or
+    `seconds` have passed. Return the same tuple as `likelihood_weighting`.
+    """
+    prior, inheritance, trait_table, evidence, (mothers, fathers, founders) = family_tables(people, names)
+    prior, inheritance = log_table(prior), log_table(inheritance)
+
+    # For each person, the children they are a mother or father of
+    as_mother = [np.flatnonzero(~founders & (mothers == i)) for i in range(len(names))]
+    as_father = [np.flatnonzero(~founders & (fathers == i)) for i in range(len(names))]
+    traits = known_traits(people, names)
+
+    genes = np.zeros((GIBBS_CHAINS, len(names)), dtype=np.int64)
+    gene_totals = np.zeros((len(names), 3))
+    trait_totals = np.zeros((len(names), 2))
+    drawn = 0
+    sweeps = 0
+    start = time.perf_counter()
+    while budget_left(drawn, samples, start, seconds):
+        for i in range(len(names)):
+            if founders[i]:
+                log_p = np.tile(prior + evidence[i], (GIBBS_CHAINS, 1))
+            else:
+                log_p = inheritance[genes[:, mothers[i]], genes[:, fathers[i]]] + evidence[i]
+            for child in as_mother[i]:
+                log_p += inheritance[:, genes[:, fathers[child]], genes[:, child]].T
+            for child in as_father[i]:
+                log_p += inheritance[genes[:, mothers[child]], :, genes[:, child]]
+            genes[:, i] = sample_genes(log_p, rng)
+
+        sweeps += 1
+        if sweeps > GIBBS_BURN_IN:
+            for g in range(3):
+                gene_totals[:, g] += (genes == g).sum(axis=0)
+            trait_totals[:, 1] += np.where(
+                np.isnan(traits), trait_table[genes, 1], traits
+            ).sum(axis=0)
+            drawn += GIBBS_CHAINS
+
+    total = gene_totals.sum(axis=1, keepdims=True)
+    trait_totals[:, 0] = total[:, 0] - trait_totals[:, 1]
+    return gene_totals / total, trait_totals / total, drawn
+
+
+def known_traits(people, names):
+    """
+    Return an array with 1 or 0 for each person whose trait is known,
+    and NaN for each person whose trait is unknown.
+    """
+    return np.array([
+        np.nan if people[name]["trait"] is None else float(people[name]["trait"])
+        for name in names
+    ])
+
+
+def budget_left(drawn, samples, start, seconds):
+    """
+    Return True if a sampler that has drawn `drawn` samples since `start`
+    should continue under a budget of `samples` samples and `seconds` seconds.
+    """
+    if seconds is not None and time.perf_counter() - start >= seconds:
+        return False
+    return samples is None or drawn < samples
+
+
+def run_chain(method, people, samples, seconds, seed):
+    """
+    Run one independent chain of the sampler named `method` with its own
+    random seed, and return its estimates.
+    """
+    return SAMPLERS[method](people, list(people), samples, seconds, np.random.default_rng(seed))
+
+
+def monte_carlo_probabilities(people, method="gibbs", samples=None, seconds=None,
+                              chains=None, seed=None):
+    """
+    Return approximate gene and trait distributions for each person and
+    the standard error of each probability, as a tuple of arrays
+    `(genes, traits, gene_errors, trait_errors)` in the order of `people`.
+
+    `chains` independent chains of the sampler named `method` ("weighting"
+    or "gibbs") run in a pool of processes, sharing a budget of `samples`
+    samples (SAMPLES if no budget is given) and each stopping after
+    `seconds` seconds if set. Estimates are averaged over the chains,
+    and their spread between chains gives the standard errors.
+    """
+    chains = chains or max(4, os.cpu_count() or 1)
+    if samples is None and seconds is None:
+        samples = SAMPLES
+    per_chain = None if samples is None else -(-samples // chains)
+    seeds = np.random.SeedSequence(seed).spawn(chains)
+
+    with ProcessPoolExecutor(chains) as pool:
+        results = list(pool.map(
+            run_chain, [method] * chains, [people] * chains,
+            [per_chain] * chains, [seconds] * chains, seeds
+        ))
+    genes = np.array([result[0] for result in results])
+    traits = np.array([result[1] for result in results])
+
+    if chains > 1:
+        gene_errors = genes.std(axis=0, ddof=1) / np.sqrt(chains)
+        trait_errors = traits.std(axis=0, ddof=1) / np.sqrt(chains)
+    else:
+        gene_errors = np.full(genes.shape[1:], np.nan)
+        trait_errors = np.full(traits.shape[1:], np.nan)
+    return genes.mean(axis=0), traits.mean(axis=0), gene_errors, trait_errors
+
+
+def family_signature(people):
+    """
+    Return a hashable description of a family that ignores names: for
+    each person in ancestral order, the positions of their parents in that
+    order and their known trait. Families with equal signatures have the
+    same probabilities, person by person in that order.
+    """
+    order = ancestral_order(people)
+    position = {name: i for i, name in enumerate(order)}
+    return order, tuple(
+        (position.get(people[name]["mother"]), position.get(people[name]["father"]),
+         people[name]["trait"])
+        for name in order
+    )
+
+
+@lru_cache(maxsize=RESULT_CACHE_SIZE)
+def solve_signature(method, signature):
+    """
+    Return the gene and trait distributions of a family with the given
+    `family_signature` as (people, 3) and (people, 2) arrays in signature
+    order.
+    """
+    names = [f"{i}" for i in range(len(signature))]
+    people = {
+        name: {
+            "name": name,
+            "mother": None if mother is None else names[mother],
+            "father": None if father is None else names[father],
+            "trait": trait
+        }
+        for name, (mother, father, trait) in zip(names, signature)
+    }
+    return METHODS[method](people)
+
+
+def solve_family(task):
+    """
+    Compute the results of one batch family, given as a tuple
+    `(family, source, method)` where `source` is a CSV path or a line of
+    JSONL (see `batch_families`). Return the result as a line of JSON,
+    with an "error" instead of probabilities if the family cannot be
+    read or solved.
+    """
+    family, source, method = task
+    try:
+        if isinstance(source, tuple):
+            record = json.loads(source[0])
+            family = record.get("family", family)
+            people = read_people(record["people"])
+        else:
+            people = load_data(source)
+        order, signature = family_signature(people)
+        probabilities = as_dictionary(order, *solve_signature(method, signature))
+        return json.dumps({"family": family, "probabilities": probabilities})
+    except Exception as error:
+        return json.dumps({"family": family, "error": f"{type(error).__name__}: {error}"})
+
+
+def solve_families(tasks):
+    """
+    Return the lines of JSON that `solve_family` gives for each of `tasks`.
+    """
+    return [solve_family(task) for task in tasks]
+
+
+def batch_families(source):
+    """
+    Lazily generate `(family, source)` pairs from a directory of CSV files
+    (one family per file) or a JSONL file in which each line has a
+    "family" name and a list of "people" with fields name, mother,
+    father, trait. "-" reads JSONL from standard input.
+
+    For CSV files, `source` is the path. For JSONL, `source` is a 1-tuple
+    holding the unparsed line and `family` is its line number, so that a
+    malformed line is reported by the worker instead of stopping the batch.
+    """
+    if source != "-" and os.path.isdir(source):
+        for filename in sorted(os.listdir(source)):
+            if filename.endswith(".csv"):
+                yield filename, os.path.join(source, filename)
+        return
+
+    f = sys.stdin if source == "-" else open(source)
+    try:
+        for number, line in enumerate(f, 1):
+            if line.strip():
+                yield number, (line,)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def run_batch(source, output, method="elimination", workers=None):
+    """
+    Compute probabilities for every family in `source` (see
+    `batch_families`) across a pool of `workers` processes, writing one
+    line of JSON per family to `output` in input order as results arrive.
+
+    Each worker keeps the tables shared by every family (see
+    `person_factor`) and the results of recently seen family shapes, so
+    families that differ only in names are computed once per worker.
+
+    Families are read only as workers need them: at most `BATCH_WINDOW`
+    chunks of `BATCH_CHUNK` families per worker are in flight, so large
+    inputs and standard input are streamed. If a worker dies, the batch
+    stops with `BrokenProcessPool`.
+    """
+    workers = workers or os.cpu_count() or 1
+    tasks = ((family, data, method) for family, data in batch_families(source))
+    chunks = iter(lambda: list(itertools.islice(tasks, BATCH_CHUNK)), [])
+    pending = deque()
+
+    def write(future):
+        for line in future.result():
+            output.write(line + "\n")
+        output.flush()
+
+    with ProcessPoolExecutor(workers) as pool:
+        for chunk in chunks:
+            pending.append(pool.submit(solve_families, chunk))
+            if len(pending) >= BATCH_WINDOW * workers:
+                write(pending.popleft())
+        while pending:
+            write(pending.popleft())
+
+
+METHODS = {
+    "elimination": eliminate_probabilities,
+    "batch": batch_probabilities,
+    "enumeration": enumerate_probabilities
+}
+
+SAMPLERS = {
+    "weighting": likelihood_weighting,
+    "gibbs": gibbs_sampling
+}
+
+
 # only passes 8/16 on submit - failing more tests (but check50 says correct)
 
 if __name__ == "__main__":
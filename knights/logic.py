@@ -1,7 +1,69 @@
+import heapq
 import itertools
+import weakref
+
+import numpy as np
+
+# Conflicts before the first restart, and growth factor between restarts
+RESTART_INTERVAL = 100
+RESTART_GROWTH = 1.5
+
+# Decay applied to variable activities after each conflict
+ACTIVITY_DECAY = 0.95
+
+# Most symbols `truth_table_check` will build a truth table for
+TRUTH_TABLE_LIMIT = 25
+
+# Ways `model_check` can decide entailment
+METHODS = ("enumerate", "sat", "truth_table")
 
 
 class Sentence():
+    """
+    Logical sentences are immutable and interned: building a sentence
+    equal to an existing one returns that same object, so equal sentences
+    share memory and compare by identity. Each sentence's hash is
+    computed once, when it is first built, and its set of symbols the
+    first time it is asked for.
+    """
+
+    __slots__ = ("arguments", "_hash", "_symbols", "__weakref__")
+
+    # Sentences by class and arguments, for as long as they are in use
+    interned = weakref.WeakValueDictionary()
+
+    @classmethod
+    def intern(cls, arguments, **fields):
+        """
+        Returns the sentence of this class with `arguments`, building it
+        with attributes `fields` if it does not exist yet.
+        """
+        key = (cls, arguments)
+        sentence = Sentence.interned.get(key)
+        if sentence is None:
+            sentence = object.__new__(cls)
+            for name, value in fields.items():
+                object.__setattr__(sentence, name, value)
+            object.__setattr__(sentence, "arguments", arguments)
+            object.__setattr__(sentence, "_hash", hash(key))
+            object.__setattr__(sentence, "_symbols", None)
+            Sentence.interned[key] = sentence
+        return sentence
+
+    def __eq__(self, other):
+        return self is other
+
+    def __hash__(self):
+        return self._hash
+
+    def __setattr__(self, name, value):
+        raise AttributeError("logical sentences are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("logical sentences are immutable")
+
+    def __reduce__(self):
+        return (type(self), self.arguments)
 
     def evaluate(self, model):
         """Evaluates the logical sentence."""
@@ -12,8 +74,56 @@ class Sentence():
         return ""
 
     def symbols(self):
-        """Returns a set of all symbols in the logical sentence."""
-        return set()
+        """Returns a frozen set of all symbols in the logical sentence."""
+        if self._symbols is None:
+
+            # Visit each shared subsentence once, reusing known symbol sets
+            symbols = set()
+            stack = [self]
+            seen = {self}
+            while stack:
+                sentence = stack.pop()
+                if isinstance(sentence, Symbol):
+                    symbols.add(sentence.name)
+                elif sentence._symbols is not None:
+                    symbols |= sentence._symbols
+                else:
+                    for operand in sentence.arguments:
+                        if operand not in seen:
+                            seen.add(operand)
+                            stack.append(operand)
+            object.__setattr__(self, "_symbols", frozenset(symbols))
+        return self._symbols
+
+    def source(self, index):
+        """
+        Returns a Python expression for the logical sentence over a model
+        vector `m`, where `index` maps each symbol to its position in `m`.
+        """
+        raise Exception("nothing to compile")
+
+    def truth_table(self, columns):
+        """
+        Returns the truth value of the logical sentence in every model at
+        once, as a uint64 array with one bit per model, given the array
+        of each symbol in `columns`.
+        """
+        raise Exception("nothing to evaluate")
+
+    def compile(self, symbols=None):
+        """
+        Returns a function that evaluates the logical sentence in a model
+        given as a sequence of truth values, one per name in `symbols`
+        (by default, the sentence's symbols in sorted order).
+        """
+        if symbols is None:
+            symbols = sorted(self.symbols())
+        index = {symbol: i for i, symbol in enumerate(symbols)}
+        try:
+            return eval(f"lambda m: {self.source(index)}", {})
+        except (RecursionError, MemoryError, SyntaxError):
+            # Too deeply nested for the Python compiler
+            return lambda m: self.evaluate(dict(zip(symbols, m)))
 
     @classmethod
     def validate(cls, sentence):
@@ -43,15 +153,10 @@ class Sentence():
 
 
 class Symbol(Sentence):
+    __slots__ = ("name",)
 
-    def __init__(self, name):
-        self.name = name
-
-    def __eq__(self, other):
-        return isinstance(other, Symbol) and self.name == other.name
-
-    def __hash__(self):
-        return hash(("symbol", self.name))
+    def __new__(cls, name):
+        return cls.intern((name,), name=name)
 
     def __repr__(self):
         return self.name
@@ -62,23 +167,28 @@ class Symbol(Sentence):
         except KeyError:
             raise Exception(f"variable {self.name} not in model")
 
+    def truth_table(self, columns):
+        try:
+            return columns[self.name]
+        except KeyError:
+            raise Exception(f"variable {self.name} not in model")
+
     def formula(self):
         return self.name
 
-    def symbols(self):
-        return {self.name}
+    def source(self, index):
+        try:
+            return f"m[{index[self.name]}]"
+        except KeyError:
+            raise Exception(f"variable {self.name} not in model")
 
 
 class Not(Sentence):
-    def __init__(self, operand):
-        Sentence.validate(operand)
-        self.operand = operand
-
-    def __eq__(self, other):
-        return isinstance(other, Not) and self.operand == other.operand
+    __slots__ = ("operand",)
 
-    def __hash__(self):
-        return hash(("not", hash(self.operand)))
+    def __new__(cls, operand):
+        Sentence.validate(operand)
+        return cls.intern((operand,), operand=operand)
 
     def __repr__(self):
         return f"Not({self.operand})"
@@ -89,23 +199,20 @@ class Not(Sentence):
     def formula(self):
         return "¬" + Sentence.parenthesize(self.operand.formula())
 
-    def symbols(self):
-        return self.operand.symbols()
+    def source(self, index):
+        return f"(not {self.operand.source(index)})"
+
+    def truth_table(self, columns):
+        return ~self.operand.truth_table(columns)
 
 
 class And(Sentence):
-    def __init__(self, *conjuncts):
+    __slots__ = ("conjuncts",)
+
+    def __new__(cls, *conjuncts):
         for conjunct in conjuncts:
             Sentence.validate(conjunct)
-        self.conjuncts = list(conjuncts)
-
-    def __eq__(self, other):
-        return isinstance(other, And) and self.conjuncts == other.conjuncts
-
-    def __hash__(self):
-        return hash(
-            ("and", tuple(hash(conjunct) for conjunct in self.conjuncts))
-        )
+        return cls.intern(conjuncts, conjuncts=conjuncts)
 
     def __repr__(self):
         conjunctions = ", ".join(
@@ -114,8 +221,8 @@ class And(Sentence):
         return f"And({conjunctions})"
 
     def add(self, conjunct):
-        Sentence.validate(conjunct)
-        self.conjuncts.append(conjunct)
+        """Returns the conjunction of this sentence's conjuncts and `conjunct`."""
+        return And(*self.conjuncts, conjunct)
 
     def evaluate(self, model):
         return all(conjunct.evaluate(model) for conjunct in self.conjuncts)
@@ -126,23 +233,27 @@ class And(Sentence):
         return " ∧ ".join([Sentence.parenthesize(conjunct.formula())
                            for conjunct in self.conjuncts])
 
-    def symbols(self):
-        return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
+    def source(self, index):
+        if not self.conjuncts:
+            return "True"
+        return "(" + " and ".join(
+            conjunct.source(index) for conjunct in self.conjuncts
+        ) + ")"
+
+    def truth_table(self, columns):
+        table = ~np.uint64(0)
+        for conjunct in self.conjuncts:
+            table = table & conjunct.truth_table(columns)
+        return table
 
 
 class Or(Sentence):
-    def __init__(self, *disjuncts):
+    __slots__ = ("disjuncts",)
+
+    def __new__(cls, *disjuncts):
         for disjunct in disjuncts:
             Sentence.validate(disjunct)
-        self.disjuncts = list(disjuncts)
-
-    def __eq__(self, other):
-        return isinstance(other, Or) and self.disjuncts == other.disjuncts
-
-    def __hash__(self):
-        return hash(
-            ("or", tuple(hash(disjunct) for disjunct in self.disjuncts))
-        )
+        return cls.intern(disjuncts, disjuncts=disjuncts)
 
     def __repr__(self):
         disjuncts = ", ".join([str(disjunct) for disjunct in self.disjuncts])
@@ -157,24 +268,29 @@ class Or(Sentence):
         return " ∨  ".join([Sentence.parenthesize(disjunct.formula())
                             for disjunct in self.disjuncts])
 
-    def symbols(self):
-        return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
+    def source(self, index):
+        if not self.disjuncts:
+            return "False"
+        return "(" + " or ".join(
+            disjunct.source(index) for disjunct in self.disjuncts
+        ) + ")"
+
+    def truth_table(self, columns):
+        table = np.uint64(0)
+        for disjunct in self.disjuncts:
+            table = table | disjunct.truth_table(columns)
+        return table
 
 
 class Implication(Sentence):
-    def __init__(self, antecedent, consequent):
+    __slots__ = ("antecedent", "consequent")
+
+    def __new__(cls, antecedent, consequent):
         Sentence.validate(antecedent)
         Sentence.validate(consequent)
-        self.antecedent = antecedent
-        self.consequent = consequent
-
-    def __eq__(self, other):
-        return (isinstance(other, Implication)
-                and self.antecedent == other.antecedent
-                and self.consequent == other.consequent)
-
-    def __hash__(self):
-        return hash(("implies", hash(self.antecedent), hash(self.consequent)))
+        return cls.intern(
+            (antecedent, consequent), antecedent=antecedent, consequent=consequent
+        )
 
     def __repr__(self):
         return f"Implication({self.antecedent}, {self.consequent})"
@@ -188,24 +304,23 @@ class Implication(Sentence):
         consequent = Sentence.parenthesize(self.consequent.formula())
         return f"{antecedent} => {consequent}"
 
-    def symbols(self):
-        return set.union(self.antecedent.symbols(), self.consequent.symbols())
+    def source(self, index):
+        antecedent = self.antecedent.source(index)
+        consequent = self.consequent.source(index)
+        return f"(not {antecedent} or {consequent})"
+
+    def truth_table(self, columns):
+        return (~self.antecedent.truth_table(columns)
+                | self.consequent.truth_table(columns))
 
 
 class Biconditional(Sentence):
-    def __init__(self, left, right):
+    __slots__ = ("left", "right")
+
+    def __new__(cls, left, right):
         Sentence.validate(left)
         Sentence.validate(right)
-        self.left = left
-        self.right = right
-
-    def __eq__(self, other):
-        return (isinstance(other, Biconditional)
-                and self.left == other.left
-                and self.right == other.right)
-
-    def __hash__(self):
-        return hash(("biconditional", hash(self.left), hash(self.right)))
+        return cls.intern((left, right), left=left, right=right)
 
     def __repr__(self):
         return f"Biconditional({self.left}, {self.right})"
@@ -221,43 +336,618 @@ class Biconditional(Sentence):
         right = Sentence.parenthesize(str(self.right))
         return f"{left} <=> {right}"
 
-    def symbols(self):
-        return set.union(self.left.symbols(), self.right.symbols())
-
+    def source(self, index):
+        # Each side is evaluated once; both are always True or False
+        return f"({self.left.source(index)} == {self.right.source(index)})"
 
-def model_check(knowledge, query):
-    """Checks if knowledge base entails query."""
+    def truth_table(self, columns):
+        return ~(self.left.truth_table(columns) ^ self.right.truth_table(columns))
 
-    def check_all(knowledge, query, symbols, model):
-        """Checks if knowledge base entails query, given a particular model."""
 
-        # If model has an assignment for each symbol
-        if not symbols:
+# Empty conjunction and disjunction, which are always true and false
+TRUE = And()
+FALSE = Or()
 
-            # If knowledge base is true in model, then query must also be true
-            if knowledge.evaluate(model):
-                return query.evaluate(model)
-            return True
-        else:
 
-            # Choose one of the remaining unused symbols
-            remaining = symbols.copy()
-            p = remaining.pop()
+def simplify(sentence):
+    """
+    Returns an equivalent sentence built only from symbols, negated
+    symbols, And, Or and Biconditional, with nested conjunctions and
+    disjunctions flattened, repeated operands removed, constants folded,
+    and symbols known from top-level conjuncts substituted into the rest.
 
-            # Create a model where the symbol is true
-            model_true = model.copy()
-            model_true[p] = True
+    Biconditionals are only expanded into clauses between two literals,
+    so nested biconditionals stay linear in size:
 
-            # Create a model where the symbol is false
-            model_false = model.copy()
-            model_false[p] = False
+    >>> chain = Symbol("X0")
+    >>> for i in range(1, 23):
+    ...     chain = Biconditional(chain, Symbol(f"X{i}"))
+    >>> len(simplify(chain).formula()) < 2 * len(chain.formula())
+    True
+    """
+    sentence = negation_normal_form(sentence, False, dict())
 
-            # Ensure entailment holds in both models
-            return (check_all(knowledge, query, remaining, model_true) and
-                    check_all(knowledge, query, remaining, model_false))
+    # Unit propagation: a symbol or its negation as a top-level conjunct
+    # fixes that symbol everywhere else
+    units = dict()
+    while True:
+        conjuncts = sentence.conjuncts if isinstance(sentence, And) else (sentence,)
+        found = dict()
+        for conjunct in conjuncts:
+            if isinstance(conjunct, Symbol):
+                found.setdefault(conjunct.name, True)
+            elif isinstance(conjunct, Not):
+                found.setdefault(conjunct.operand.name, False)
+        if not found:
+            break
+        units.update(found)
+        sentence = substitute(sentence, found, dict())
+    if sentence is FALSE:
+        return FALSE
+    return conjoin([
+        Symbol(name) if value else Not(Symbol(name)) for name, value in units.items()
+    ] + [sentence])
+
+
+def negation_normal_form(sentence, negate, memo):
+    """
+    Returns a sentence equivalent to `sentence` (or to its negation, if
+    `negate`), with negations pushed down onto symbols, implications
+    rewritten with And, Or and Not, and biconditionals as in `biconditional`.
+    """
+    key = (sentence, negate)
+    if key in memo:
+        return memo[key]
+
+    if isinstance(sentence, Symbol):
+        result = Not(sentence) if negate else sentence
+    elif isinstance(sentence, Not):
+        result = negation_normal_form(sentence.operand, not negate, memo)
+    elif isinstance(sentence, And) or isinstance(sentence, Or):
+        operands = sentence.conjuncts if isinstance(sentence, And) else sentence.disjuncts
+        operands = [negation_normal_form(operand, negate, memo) for operand in operands]
+        result = conjoin(operands) if isinstance(sentence, And) != negate else disjoin(operands)
+    elif isinstance(sentence, Implication):
+        antecedent = negation_normal_form(sentence.antecedent, not negate, memo)
+        consequent = negation_normal_form(sentence.consequent, negate, memo)
+        if negate:
+            result = conjoin([antecedent, consequent])
+        else:
+            result = disjoin([antecedent, consequent])
+    elif isinstance(sentence, Biconditional):
+        # A negated biconditional is the same with the right side negated
+        left = negation_normal_form(sentence.left, False, memo)
+        right = negation_normal_form(sentence.right, negate, memo)
+        result = biconditional(left, right)
+    else:
+        raise TypeError("must be a logical sentence")
+
+    memo[key] = result
+    return result
+
+
+def conjoin(conjuncts):
+    """
+    Returns the conjunction of `conjuncts`, flattened, without repeats
+    and with constants folded.
+    """
+    return combine(conjuncts, And, TRUE, FALSE)
+
+
+def disjoin(disjuncts):
+    """
+    Returns the disjunction of `disjuncts`, flattened, without repeats
+    and with constants folded.
+    """
+    return combine(disjuncts, Or, FALSE, TRUE)
+
+
+def combine(operands, kind, identity, absorbing):
+    """
+    Returns `kind` (And or Or) of `operands`, where `identity` is the
+    empty sentence of that kind and `absorbing` the opposite constant.
+    """
+    flat = dict()
+    for operand in operands:
+        if operand is absorbing:
+            return absorbing
+        for operand in (operand.arguments if isinstance(operand, kind) else (operand,)):
+            flat[operand] = None
+
+    # A symbol alongside its negation is also absorbing
+    for operand in flat:
+        if isinstance(operand, Not) and operand.operand in flat:
+            return absorbing
+    if len(flat) == 1:
+        return next(iter(flat))
+    return kind(*flat)
+
+
+def biconditional(left, right):
+    """
+    Returns a sentence equivalent to `left` <=> `right`, for sentences in
+    negation normal form. Constants are folded, and a biconditional
+    between two literals is expanded into the clauses (¬l ∨ r) ∧ (l ∨ ¬r).
+    Any other biconditional is kept, since expanding it would copy both
+    sides and nested biconditionals would grow exponentially.
+    """
+    for side, other in ((left, right), (right, left)):
+        if side is TRUE:
+            return other
+        if side is FALSE:
+            return negation_normal_form(other, True, dict())
+    if left is right:
+        return TRUE
+
+    literals = (Symbol, Not)
+    if isinstance(left, literals) and isinstance(right, literals):
+        not_left = negation_normal_form(left, True, dict())
+        not_right = negation_normal_form(right, True, dict())
+        if not_left is right:
+            return FALSE
+        return conjoin([disjoin([not_left, right]), disjoin([left, not_right])])
+    return Biconditional(left, right)
+
+
+def substitute(sentence, units, memo):
+    """
+    Returns a sentence in negation normal form with each symbol named in
+    `units` replaced by its truth value, then simplified.
+    """
+    if sentence in memo:
+        return memo[sentence]
+    if isinstance(sentence, Symbol):
+        result = sentence
+        if sentence.name in units:
+            result = TRUE if units[sentence.name] else FALSE
+    elif isinstance(sentence, Not):
+        result = sentence
+        if sentence.operand.name in units:
+            result = FALSE if units[sentence.operand.name] else TRUE
+    elif isinstance(sentence, And):
+        result = conjoin([substitute(operand, units, memo) for operand in sentence.conjuncts])
+    elif isinstance(sentence, Biconditional):
+        result = biconditional(
+            substitute(sentence.left, units, memo), substitute(sentence.right, units, memo)
+        )
+    else:
+        result = disjoin([substitute(operand, units, memo) for operand in sentence.disjuncts])
+    memo[sentence] = result
+    return result
+
+
+def model_check(knowledge, query, method="enumerate"):
+    """
+    Checks if knowledge base entails query, by enumerating every model
+    or, if `method` is "sat" or "truth_table", with `sat_check` or
+    `truth_table_check`. Both sentences are simplified first.
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown method {method!r}")
+    knowledge = simplify(knowledge)
+    query = simplify(query)
+    if method == "sat":
+        return sat_check(knowledge, query)
+    if method == "truth_table":
+        return truth_table_check(knowledge, query)
 
     # Get all symbols in both knowledge and query
-    symbols = set.union(knowledge.symbols(), query.symbols())
-
-    # Check that knowledge entails query
-    return check_all(knowledge, query, symbols, dict())
+    symbols = sorted(knowledge.symbols() | query.symbols())
+
+    # Knowledge entails query if query is true in every model where
+    # knowledge is, checked in one compiled function per model
+    check = Implication(knowledge, query).compile(symbols)
+    return all(map(check, itertools.product((True, False), repeat=len(symbols))))
+
+
+def truth_columns(symbols):
+    """
+    Returns a dictionary mapping each of `symbols` to a uint64 array with
+    one bit per model of the symbols, set where the symbol is true. Model
+    k sets symbol i to bit i of k, and is bit k % 64 of word k // 64.
+    """
+    words = max(1, 2 ** len(symbols) // 64)
+    columns = dict()
+    for i, symbol in enumerate(symbols):
+        if i < 6:
+            # Symbol alternates within each word, in runs of 2 ** i bits
+            pattern = sum(1 << bit for bit in range(64) if bit >> i & 1)
+            columns[symbol] = np.full(words, pattern, dtype=np.uint64)
+        else:
+            # Symbol alternates between whole words, in runs of 2 ** (i - 6)
+            true = (np.arange(words) >> (i - 6) & 1).astype(bool)
+            columns[symbol] = np.where(true, ~np.uint64(0), np.uint64(0))
+    return columns
+
+
+def truth_table_check(knowledge, query):
+    """
+    Checks if knowledge base entails query by evaluating both in all
+    models at once, 64 models per machine word, with bitwise operations.
+    """
+    symbols = sorted(knowledge.symbols() | query.symbols())
+    if len(symbols) > TRUTH_TABLE_LIMIT:
+        raise ValueError(f"too many symbols for a truth table: {len(symbols)}")
+
+    # Models where knowledge holds but query does not, ignoring the unused
+    # bits of the only word when there are fewer than 64 models
+    columns = truth_columns(symbols)
+    counterexamples = knowledge.truth_table(columns) & ~query.truth_table(columns)
+    if len(symbols) < 6:
+        counterexamples &= (1 << 2 ** len(symbols)) - 1
+    return not counterexamples.any()
+
+
+def sat_check(knowledge, query):
+    """
+    Checks if knowledge base entails query, by converting both to CNF and
+    checking that knowledge and not query cannot be satisfied together.
+    """
+    cnf = CNF()
+    cnf.add(knowledge)
+    return not cnf.solver.solve([-cnf.literal(query)])
+
+
+class KnowledgeBase():
+    """
+    Knowledge base that answers many entailment queries with one SAT
+    solver. Sentences are converted to clauses once, when told, and the
+    solver keeps its learned clauses between queries; each query only
+    adds the clauses for its own subsentences and is then assumed false.
+    """
+
+    def __init__(self, *sentences):
+        self.cnf = CNF()
+        self.sentences = []
+        self.answers = dict() # Query to whether it is entailed
+        self.models = [] # Models of the knowledge base found so far
+        for sentence in sentences:
+            self.tell(sentence)
+
+    def tell(self, sentence):
+        """Adds `sentence` to the knowledge base."""
+        Sentence.validate(sentence)
+        self.sentences.append(sentence)
+        self.cnf.add(simplify(sentence))
+
+        # Entailed queries stay entailed, but other answers may change
+        self.answers = {
+            query: entailed for query, entailed in self.answers.items() if entailed
+        }
+        self.models = [
+            model for model in self.models
+            if sentence.symbols() <= model.keys() and sentence.evaluate(model)
+        ]
+
+    def ask(self, query):
+        """Checks if the knowledge base entails `query`."""
+        Sentence.validate(query)
+        if query not in self.answers:
+            self.answers[query] = self.entails(query)
+        return self.answers[query]
+
+    def entails(self, query):
+        """Checks if the knowledge base entails `query`, without caching."""
+
+        # A known model where query is false is a counterexample
+        symbols = query.symbols()
+        for model in self.models:
+            if symbols <= model.keys() and not query.evaluate(model):
+                return False
+
+        solver = self.cnf.solver
+        if solver.solve([-self.cnf.literal(simplify(query))]):
+            self.models.append({
+                name: solver.model[variable]
+                for name, variable in self.cnf.variables.items()
+            })
+            return False
+        return True
+
+    def satisfiable(self):
+        """Checks if some model makes every sentence in the knowledge base true."""
+        return self.cnf.solver.solve()
+
+
+class CNF():
+    """
+    Conjunctive normal form of sentences, built with the Tseitin
+    transformation: every compound subsentence gets a fresh variable
+    constrained to equal it, so the clauses grow linearly with the
+    sentences instead of exponentially. Variables are positive integers
+    and a literal is a variable or its negation, as in DIMACS.
+    """
+
+    def __init__(self, solver=None):
+        self.solver = solver if solver is not None else SATSolver()
+        self.variables = dict() # Symbol name to variable
+        self.literals = dict() # Sentence to literal equal to it
+
+    def variable(self, name):
+        """Returns the variable for the symbol called `name`."""
+        if name not in self.variables:
+            self.variables[name] = self.solver.new_variable()
+        return self.variables[name]
+
+    def add(self, sentence):
+        """Adds clauses requiring `sentence` to be true."""
+        if isinstance(sentence, And):
+            for conjunct in sentence.conjuncts:
+                self.add(conjunct)
+        elif isinstance(sentence, Or):
+            self.solver.add_clause(
+                [self.literal(disjunct) for disjunct in sentence.disjuncts]
+            )
+        else:
+            self.solver.add_clause([self.literal(sentence)])
+
+    def literal(self, sentence):
+        """Returns a literal that is true exactly when `sentence` is."""
+        if isinstance(sentence, Symbol):
+            return self.variable(sentence.name)
+        if isinstance(sentence, Not):
+            return -self.literal(sentence.operand)
+        if sentence in self.literals:
+            return self.literals[sentence]
+
+        x = self.solver.new_variable()
+        add_clause = self.solver.add_clause
+        if isinstance(sentence, And):
+            literals = [self.literal(conjunct) for conjunct in sentence.conjuncts]
+            for literal in literals:
+                add_clause([-x, literal])
+            add_clause([x] + [-literal for literal in literals])
+        elif isinstance(sentence, Or):
+            literals = [self.literal(disjunct) for disjunct in sentence.disjuncts]
+            for literal in literals:
+                add_clause([x, -literal])
+            add_clause([-x] + literals)
+        elif isinstance(sentence, Implication):
+            a = self.literal(sentence.antecedent)
+            c = self.literal(sentence.consequent)
+            add_clause([-x, -a, c])
+            add_clause([x, a])
+            add_clause([x, -c])
+        elif isinstance(sentence, Biconditional):
+            a = self.literal(sentence.left)
+            b = self.literal(sentence.right)
+            add_clause([-x, -a, b])
+            add_clause([-x, a, -b])
+            add_clause([x, a, b])
+            add_clause([x, -a, -b])
+        else:
+            raise TypeError("must be a logical sentence")
+        self.literals[sentence] = x
+        return x
+
+
+class SATSolver():
+    """
+    Conflict-driven clause learning SAT solver over DIMACS-style literals.
+
+    Unit propagation watches two literals per clause. Each conflict is
+    analyzed back to its first unique implication point, the learned
+    clause is kept and the search jumps back to the level where it becomes
+    unit. Decisions pick the most active variable with its last value.
+
+    Clauses may be added between calls to `solve`, and learned clauses
+    stay valid, since they only follow from the clauses. Assumptions are
+    decided first and hold for a single call.
+    """
+
+    def __init__(self):
+        self.num_variables = 0
+        self.watches = dict() # Literal to clauses watching it
+        self.assignment = set() # Literals currently true
+        self.level = [0]
+        self.reason = [None]
+        self.activity = [0.0]
+        self.phase = [False]
+        self.trail = [] # Literals in the order they were assigned
+        self.trail_limits = [] # Trail length at the start of each level
+        self.head = 0 # Next trail position to propagate
+        self.queue = [] # Heap of (-activity, variable) for decisions
+        self.increment = 1.0
+        self.unsatisfiable = False
+        self.model = None
+
+    def new_variable(self):
+        """Adds a variable and returns it."""
+        self.num_variables += 1
+        variable = self.num_variables
+        self.watches[variable] = []
+        self.watches[-variable] = []
+        self.level.append(0)
+        self.reason.append(None)
+        self.activity.append(0.0)
+        self.phase.append(False)
+        heapq.heappush(self.queue, (0.0, variable))
+        return variable
+
+    def add_clause(self, literals):
+        """Adds the clause that at least one of `literals` is true."""
+        clause = []
+        for literal in literals:
+            if literal in self.assignment or -literal in clause:
+                return
+            if -literal not in self.assignment and literal not in clause:
+                clause.append(literal)
+
+        if not clause:
+            self.unsatisfiable = True
+        elif len(clause) == 1:
+            self.assign(clause[0], None)
+            if self.propagate() is not None:
+                self.unsatisfiable = True
+        else:
+            self.watches[clause[0]].append(clause)
+            self.watches[clause[1]].append(clause)
+
+    def assign(self, literal, reason):
+        """Makes `literal` true at the current level, implied by `reason`."""
+        variable = abs(literal)
+        self.assignment.add(literal)
+        self.level[variable] = len(self.trail_limits)
+        self.reason[variable] = reason
+        self.phase[variable] = literal > 0
+        self.trail.append(literal)
+
+    def propagate(self):
+        """
+        Assigns every literal implied by a clause whose other literals are
+        false. Returns a clause with all literals false, if any, or None.
+        Each clause watches its first two literals; the literal a clause
+        implies is always moved to its first position.
+        """
+        assignment = self.assignment
+        while self.head < len(self.trail):
+            false = -self.trail[self.head]
+            self.head += 1
+            watching = self.watches[false]
+            self.watches[false] = kept = []
+            for index, clause in enumerate(watching):
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], false
+                if clause[0] in assignment:
+                    kept.append(clause)
+                    continue
+
+                # Watch another literal that is not false, if there is one
+                for k in range(2, len(clause)):
+                    if -clause[k] not in assignment:
+                        clause[1], clause[k] = clause[k], false
+                        self.watches[clause[1]].append(clause)
+                        break
+                else:
+                    kept.append(clause)
+                    if -clause[0] in assignment:
+                        kept.extend(watching[index + 1:])
+                        return clause
+                    self.assign(clause[0], clause)
+        return None
+
+    def analyze(self, conflict):
+        """
+        Returns a learned clause for `conflict` whose first literal is the
+        negated first unique implication point, and the level to jump back
+        to, where every other literal of the clause is false.
+        """
+        current = len(self.trail_limits)
+        seen = set()
+        learned = [None]
+        pending = 0
+        index = len(self.trail) - 1
+        clause, literal = conflict, None
+        while True:
+            for other in (clause if literal is None else clause[1:]):
+                variable = abs(other)
+                if variable not in seen and self.level[variable] > 0:
+                    seen.add(variable)
+                    self.bump(variable)
+                    if self.level[variable] == current:
+                        pending += 1
+                    else:
+                        learned.append(other)
+
+            # Resolve on the latest assigned literal in the conflict
+            while abs(self.trail[index]) not in seen:
+                index -= 1
+            literal = self.trail[index]
+            index -= 1
+            pending -= 1
+            if pending == 0:
+                break
+            clause = self.reason[abs(literal)]
+
+        learned[0] = -literal
+        if len(learned) == 1:
+            return learned, 0
+        deepest = max(range(1, len(learned)), key=lambda i: self.level[abs(learned[i])])
+        learned[1], learned[deepest] = learned[deepest], learned[1]
+        return learned, self.level[abs(learned[1])]
+
+    def bump(self, variable):
+        """Raises the decision priority of a variable seen in a conflict."""
+        self.activity[variable] += self.increment
+        if self.activity[variable] > 1e100:
+            self.activity = [activity * 1e-100 for activity in self.activity]
+            self.increment *= 1e-100
+        heapq.heappush(self.queue, (-self.activity[variable], variable))
+
+    def backtrack(self, level):
+        """Unassigns every literal assigned after `level`."""
+        if len(self.trail_limits) <= level:
+            return
+        start = self.trail_limits[level]
+        for literal in self.trail[start:]:
+            self.assignment.discard(literal)
+            self.reason[abs(literal)] = None
+            heapq.heappush(self.queue, (-self.activity[abs(literal)], abs(literal)))
+        del self.trail[start:]
+        del self.trail_limits[level:]
+        self.head = len(self.trail)
+
+    def decide(self):
+        """Returns the most active unassigned variable, or None."""
+        while self.queue:
+            _, variable = heapq.heappop(self.queue)
+            if variable not in self.assignment and -variable not in self.assignment:
+                return variable
+        return None
+
+    def solve(self, assumptions=()):
+        """
+        Returns True if the clauses and `assumptions` can all be satisfied,
+        storing a satisfying assignment in `self.model` as a list of truth
+        values indexed by variable, and False otherwise.
+        """
+        if self.unsatisfiable:
+            return False
+        conflicts = 0
+        restart = RESTART_INTERVAL
+        try:
+            while True:
+                conflict = self.propagate()
+                if conflict is not None:
+                    if not self.trail_limits:
+                        self.unsatisfiable = True
+                        return False
+                    learned, level = self.analyze(conflict)
+                    self.backtrack(level)
+                    if len(learned) > 1:
+                        self.watches[learned[0]].append(learned)
+                        self.watches[learned[1]].append(learned)
+                        self.assign(learned[0], learned)
+                    else:
+                        self.assign(learned[0], None)
+                    self.increment /= ACTIVITY_DECAY
+
+                    # Restart now and then, keeping learned clauses
+                    conflicts += 1
+                    if conflicts >= restart:
+                        conflicts = 0
+                        restart *= RESTART_GROWTH
+                        self.backtrack(0)
+                    continue
+
+                # Decide assumptions first, one level each
+                level = len(self.trail_limits)
+                if level < len(assumptions):
+                    literal = assumptions[level]
+                    if -literal in self.assignment:
+                        return False
+                    self.trail_limits.append(len(self.trail))
+                    if literal not in self.assignment:
+                        self.assign(literal, None)
+                    continue
+
+                variable = self.decide()
+                if variable is None:
+                    self.model = [None] + [
+                        i in self.assignment for i in range(1, self.num_variables + 1)
+                    ]
+                    return True
+                self.trail_limits.append(len(self.trail))
+                self.assign(variable if self.phase[variable] else -variable, None)
+        finally:
+            self.backtrack(0)
@@ -0,0 +1,212 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from pagerank import *
+
+AVERAGE_LINKS = 10
+DANGLING_FRACTION = 0.5
+POWER_LAW_EXPONENT = 2.1
+SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+BENCHMARK_SAMPLES = 10000
+REFERENCE_TOLERANCE = 1e-12
+
+# Largest number of pages each engine is run on, if limited
+ENGINE_LIMITS = {
+    "sample_pagerank": 2000,
+    "crawl": 100000
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark PageRank engines on synthetic corpora."
+    )
+    parser.add_argument("--graphs", nargs="+", default=list(GENERATORS),
+                        choices=list(GENERATORS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES,
+                        help="numbers of links (10^3 to 10^7)")
+    parser.add_argument("--html", action="store_true",
+                        help="also write each corpus as HTML and time crawl")
+    parser.add_argument("--memory", action="store_true",
+                        help="rerun each engine under tracemalloc for peak memory")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes for partitioned_pagerank")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'graph':<10} {'links':>9} {'engine':<22} {'seconds':>9} "
+          f"{'links/s':>11} {'peak MB':>8} {'L1 error':>9}")
+    for name in args.graphs:
+        for num_links in args.sizes:
+            rng = np.random.default_rng(args.seed)
+            corpus = GENERATORS[name](num_links, rng)
+            for result in benchmark(corpus, args.html, args.memory, args.workers):
+                engine, seconds, peak, error = result
+                peak = f"{peak / 2 ** 20:8.1f}" if peak is not None else f"{'-':>8}"
+                error = f"{error:9.2e}" if error is not None else f"{'-':>9}"
+                print(f"{name:<10} {num_links:>9} {engine:<22} {seconds:9.3f} "
+                      f"{num_links / seconds:11.0f} {peak} {error}")
+
+
+def erdos_renyi(num_links, rng):
+    """
+    Return a corpus with `num_links` links whose sources and targets are
+    chosen uniformly at random.
+    """
+    num_pages = max(2, num_links // AVERAGE_LINKS)
+    sources = rng.integers(num_pages, size=num_links)
+    targets = rng.integers(num_pages, size=num_links)
+    return to_corpus(num_pages, sources, targets)
+
+
+def power_law(num_links, rng):
+    """
+    Return a corpus with `num_links` links whose targets follow a power-law
+    in-degree distribution, like a preferential-attachment graph.
+
+    Targets are drawn with probability proportional to a Chung-Lu weight
+    `rank ** (-1 / (POWER_LAW_EXPONENT - 1))`, which gives the same degree
+    distribution as preferential attachment without sequential growth.
+    """
+    num_pages = max(2, num_links // AVERAGE_LINKS)
+    weights = np.arange(1, num_pages + 1) ** (-1 / (POWER_LAW_EXPONENT - 1))
+    sources = rng.integers(num_pages, size=num_links)
+    targets = rng.choice(num_pages, size=num_links, p=weights / weights.sum())
+    return to_corpus(num_pages, sources, rng.permutation(num_pages)[targets])
+
+
+def heavy_dangling(num_links, rng):
+    """
+    Return a corpus with `num_links` random links in which only a fraction
+    `1 - DANGLING_FRACTION` of pages have any links of their own.
+    """
+    num_pages = max(2, num_links // AVERAGE_LINKS)
+    linking = max(1, int(num_pages * (1 - DANGLING_FRACTION)))
+    sources = rng.integers(linking, size=num_links)
+    targets = rng.integers(num_pages, size=num_links)
+    return to_corpus(num_pages, sources, targets)
+
+
+GENERATORS = {
+    "erdos": erdos_renyi,
+    "powerlaw": power_law,
+    "dangling": heavy_dangling
+}
+
+
+def to_corpus(num_pages, sources, targets):
+    """
+    Return a corpus in the format of `crawl` with pages `0.html` to
+    `{num_pages - 1}.html` and a link from each source to each target.
+    Self-links and duplicate links are dropped, as `crawl` would.
+    """
+    names = [f"{i}.html" for i in range(num_pages)]
+    keep = sources != targets
+    sources, targets = sources[keep], targets[keep]
+    order = np.argsort(sources, kind="stable")
+    bounds = np.searchsorted(sources[order], np.arange(num_pages + 1))
+    targets = targets[order].tolist()
+    return {
+        names[page]: set(names[target] for target in targets[bounds[page]:bounds[page + 1]])
+        for page in range(num_pages)
+    }
+
+
+def write_corpus(corpus, directory):
+    """
+    Write `corpus` to `directory` as one HTML file per page, laid out like
+    the pages in the corpus directories.
+    """
+    for page, links in corpus.items():
+        items = "\n".join(
+            f'            <li><a href="{link}">{link}</a></li>' for link in sorted(links)
+        )
+        with open(os.path.join(directory, page), "w") as f:
+            f.write(
+                "<!DOCTYPE html>\n<html lang=\"en\">\n"
+                f"    <head>\n        <title>{page}</title>\n    </head>\n"
+                f"    <body>\n        <h1>{page}</h1>\n\n"
+                f"        <div>Links:</div>\n        <ul>\n{items}\n        </ul>\n"
+                "    </body>\n</html>\n"
+            )
+
+
+def measure(function, memory):
+    """
+    Call `function` and return a tuple `(result, seconds, peak)`, where
+    `peak` is the peak traced allocation in bytes of a second, traced call
+    if `memory` is true, and None otherwise.
+    """
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def benchmark(corpus, html=False, memory=False, workers=None):
+    """
+    Time every engine on `corpus` and yield a tuple
+    `(engine, seconds, peak, error)` for each, where `error` is the L1
+    distance of its ranks from a tightly converged reference.
+    """
+    num_pages = len(corpus)
+    graph = LinkGraph(corpus)
+    reference = power_iterate(graph, DAMPING, SolverConfig(REFERENCE_TOLERANCE))
+
+    def error(ranks):
+        if isinstance(ranks, dict):
+            ranks = np.array([ranks[page] for page in graph.pages])
+        return float(np.abs(ranks - reference).sum())
+
+    if html and num_pages <= ENGINE_LIMITS["crawl"]:
+        with tempfile.TemporaryDirectory() as directory:
+            write_corpus(corpus, directory)
+            cache_file = os.path.join(directory, CACHE_FILE)
+
+            def cold_crawl():
+                if os.path.exists(cache_file):
+                    os.remove(cache_file)
+                return crawl(directory, cache_file=cache_file)
+
+            for engine, function in [
+                ("crawl", lambda: crawl(directory)),
+                ("crawl (cold cache)", cold_crawl),
+                ("crawl (warm cache)", lambda: crawl(directory, cache_file=cache_file))
+            ]:
+                _, seconds, peak = measure(function, memory)
+                yield engine, seconds, peak, None
+
+    engines = [
+        ("LinkGraph", lambda: LinkGraph(corpus), False),
+        ("iterate_pagerank", lambda: iterate_pagerank(corpus, DAMPING), True),
+        ("power_iterate", lambda: power_iterate(graph, DAMPING), True),
+        ("power_iterate (aitken)", lambda: power_iterate(
+            graph, DAMPING, SolverConfig(extrapolation="aitken")), True),
+        ("partitioned_pagerank", lambda: partitioned_pagerank(
+            graph, DAMPING, workers), True),
+        ("sample_pagerank", lambda: sample_pagerank(
+            corpus, DAMPING, BENCHMARK_SAMPLES), True),
+        ("batch_sample_pagerank", lambda: batch_sample_pagerank(
+            corpus, DAMPING, BENCHMARK_SAMPLES * AVERAGE_LINKS, seed=0)[0], True)
+    ]
+    for engine, function, ranked in engines:
+        if num_pages > ENGINE_LIMITS.get(engine, num_pages):
+            continue
+        result, seconds, peak = measure(function, memory)
+        yield engine, seconds, peak, error(result) if ranked else None
+
+
+if __name__ == "__main__":
+    main()
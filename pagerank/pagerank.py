@@ -1,43 +1,99 @@
+import argparse
+import json
 import os
 import random
 import re
-import sys
+import threading
+import time
+import warnings
+import zlib
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
 import numpy as np 
 
 DAMPING = 0.85
 SAMPLES = 10000
+TOLERANCE = 1e-6
+MAX_ITERATIONS = 1000
+SURFERS = 1000
+BATCHES = 30
+BURN_IN = 50
+Z_95 = 1.96
+CACHE_FILE = ".links.cache"
+CACHE_VERSION = 2
+CHUNK_SIZE = 1 << 16
+MAX_TAG_LENGTH = 1 << 16
+PARALLEL_THRESHOLD = 256
+LINK_PATTERN = re.compile(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
 
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
-    ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
+    parser = argparse.ArgumentParser(
+        description="Rank the pages of a corpus of HTML files."
+    )
+    parser.add_argument("corpus")
+    parser.add_argument("--cache", metavar="PATH", default=None,
+                        help="reuse the links parsed from unchanged pages via this file")
+    args = parser.parse_args()
+    corpus = crawl(args.corpus, cache_file=args.cache)
+    ranks, margins = batch_sample_pagerank(corpus, DAMPING, SAMPLES)
     print(f"PageRank Results from Sampling (n = {SAMPLES})")
     for page in sorted(ranks):
-        print(f"  {page}: {ranks[page]:.4f}")
+        print(f"  {page}: {ranks[page]:.4f} ± {margins[page]:.4f}")
     ranks = iterate_pagerank(corpus, DAMPING)
     print(f"PageRank Results from Iteration")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
 
 
-def crawl(directory):
+def crawl(directory, workers=None, cache_file=None):
     """
     Parse a directory of HTML pages and check for links to other pages.
     Return a dictionary where each key is a page, and values are
     a list of all other pages in the corpus that are linked to by the page.
+
+    Large directories are parsed across a pool of `workers` processes
+    (all cores by default; pass 1 to parse in this process). If
+    `cache_file` is given, the links found in each file are stored there
+    keyed by the file's modification time and size, and only files that
+    changed since the last crawl are parsed again.
     """
+    cache = load_link_cache(cache_file) if cache_file else {}
     pages = dict()
 
-    # Extract all links from HTML files
-    for filename in os.listdir(directory):
-        if not filename.endswith(".html"):
+    # Reuse cached links for files that have not changed
+    stamps = dict()
+    stale = []
+    for entry in os.scandir(directory):
+        if not entry.name.endswith(".html"):
             continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
+        stat = entry.stat()
+        stamps[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        cached = cache.get(entry.name)
+        if cached and cached[0] == stamps[entry.name]:
+            pages[entry.name] = cached[1]
+        else:
+            stale.append(entry.name)
+
+    # Extract all links from new or changed HTML files
+    paths = [os.path.join(directory, filename) for filename in stale]
+    if workers != 1 and len(stale) >= PARALLEL_THRESHOLD:
+        with ProcessPoolExecutor(workers) as pool:
+            chunksize = max(1, len(paths) // (4 * (workers or os.cpu_count() or 1)))
+            parsed = list(pool.map(parse_links, paths, chunksize=chunksize))
+    else:
+        parsed = [parse_links(path) for path in paths]
+    for filename, links in zip(stale, parsed):
+        pages[filename] = links - {filename}
+
+    if cache_file and (stale or len(cache) != len(pages)):
+        save_link_cache(cache_file, {
+            filename: (stamps[filename], links)
+            for filename, links in pages.items()
+        })
 
     # Only include links to other pages in the corpus
     for filename in pages:
@@ -49,6 +105,87 @@ def crawl(directory):
     return pages
 
 
+def parse_links(path):
+    """
+    Return the set of link targets in the HTML file at `path`.
+
+    The file is scanned in chunks of `CHUNK_SIZE` characters rather than
+    read whole; an anchor cut off at the end of a chunk is carried over
+    and matched once the rest of it has been read. Tags longer than
+    `MAX_TAG_LENGTH` characters are not treated as anchors.
+    """
+    links = set()
+    carry = ""
+    with open(path) as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            text = carry + chunk
+            end = 0
+            for match in LINK_PATTERN.finditer(text):
+                links.add(match.group(1))
+                end = match.end()
+
+            # Keep any tag that may still become a complete anchor
+            carry = ""
+            start = text.rfind("<", end)
+            if start != -1 and len(text) - start <= MAX_TAG_LENGTH:
+                tag = text[start:]
+                closed = tag.find(">")
+                if closed == -1 or 'href="' in tag[:closed]:
+                    carry = tag
+    return links
+
+
+def load_link_cache(path):
+    """
+    Load links saved by `save_link_cache` from `path`.
+    Return a dictionary mapping each filename to a tuple `(stamp, links)`,
+    or an empty dictionary if there is no usable cache.
+    """
+    try:
+        with open(path, "rb") as f:
+            version, names, entries = json.loads(zlib.decompress(f.read()))
+        if version != CACHE_VERSION:
+            return {}
+        return {
+            names[page]: (tuple(stamp), {names[link] for link in links})
+            for page, stamp, links in entries
+        }
+    except (OSError, zlib.error, ValueError, TypeError, IndexError):
+        return {}
+
+
+def save_link_cache(path, cache):
+    """
+    Save a dictionary mapping filenames to `(stamp, links)` tuples to `path`.
+
+    Every name is stored once in a string table and links are kept as
+    indexes into it, which keeps the cache compact for large corpora.
+    The cache is compressed JSON, so loading a cache found in an
+    untrusted corpus cannot run code. If `path` cannot be written, a
+    warning is issued and the cache is left as it was.
+    """
+    names = sorted(set(cache).union(*(links for _, links in cache.values())))
+    index = {name: i for i, name in enumerate(names)}
+    entries = [
+        (index[page], stamp, sorted(index[link] for link in links))
+        for page, (stamp, links) in cache.items()
+    ]
+
+    # Write to a temporary file first so an interrupted run keeps the old cache
+    temporary = f"{path}.tmp"
+    try:
+        with open(temporary, "wb") as f:
+            f.write(zlib.compress(json.dumps([CACHE_VERSION, names, entries]).encode()))
+        os.replace(temporary, path)
+    except OSError as error:
+        warnings.warn(f"could not save link cache: {error}")
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -101,7 +238,257 @@ def sample_pagerank(corpus, damping_factor, n):
     return pagerank
 
 
-def iterate_pagerank(corpus, damping_factor):
+def batch_sample_pagerank(corpus, damping_factor, n, surfers=SURFERS,
+                          seed=None):
+    """
+    Return PageRank values for each page by sampling `n` pages in total,
+    moving `surfers` independent random surfers forward together.
+
+    Each step draws every surfer's next page at once from the compiled
+    link graph: with probability `damping_factor` a surfer follows one of
+    its page's links, otherwise (or on a page without links) it jumps to
+    a page chosen uniformly from the corpus. The first `BURN_IN` steps are
+    not counted, so the uniform starting pages do not bias short walks.
+    `seed` makes runs repeatable.
+
+    Return a tuple `(ranks, margins)` of dictionaries keyed by page name.
+    `ranks` sums to 1, and `margins` holds the half-width of a 95%
+    confidence interval for each rank, estimated from the spread between
+    `BATCHES` independent groups of surfers.
+    """
+    graph = LinkGraph(corpus)
+    rng = np.random.default_rng(seed)
+    num_pages = len(graph)
+
+    surfers = max(1, min(surfers, n))
+    steps = -(-n // surfers) # Enough steps to draw at least n samples
+    batches = min(BATCHES, surfers)
+    offset = (np.arange(surfers) % batches) * num_pages # Batch of each surfer
+
+    visit_count = np.zeros(batches * num_pages)
+    visits = []
+    current = rng.integers(num_pages, size=surfers) # Random starting pages
+
+    for step in range(-BURN_IN, steps):
+        if step >= 0:
+            visits.append(offset + current)
+
+        # Choose who follows a link; everyone else gets a random page
+        follow = rng.random(surfers) < damping_factor
+        follow &= ~graph.dangling[current]
+        sample = rng.integers(num_pages, size=surfers)
+
+        walkers = current[follow]
+        link = (rng.random(walkers.size) * graph.out_degree[walkers]).astype(np.int64)
+        sample[follow] = graph.indices[graph.indptr[walkers] + link]
+        current = sample
+
+        # Tally visits in chunks to bound memory on long runs
+        if len(visits) * surfers >= 1 << 20 or step == steps - 1:
+            visit_count += np.bincount(
+                np.concatenate(visits), minlength=batches * num_pages
+            )
+            visits = []
+
+    visit_count = visit_count.reshape(batches, num_pages)
+    ranks = visit_count.sum(axis=0) / visit_count.sum()
+
+    if batches > 1:
+        batch_ranks = visit_count / visit_count.sum(axis=1, keepdims=True)
+        margins = Z_95 * batch_ranks.std(axis=0, ddof=1) / np.sqrt(batches)
+    else:
+        margins = np.full(num_pages, np.inf)
+
+    return graph.to_dict(ranks), graph.to_dict(margins)
+
+
+class LinkGraph():
+
+    def __init__(self, corpus):
+        """
+        Compile a corpus returned by `crawl` into a sparse transition matrix.
+
+        Pages are numbered in sorted order and `index` maps each page name
+        to its row. Outgoing links are stored in CSR form: the pages linked
+        to by page `i` are `indices[indptr[i]:indptr[i + 1]]`.
+        """
+        self.pages = sorted(corpus)
+        self.index = {page: i for i, page in enumerate(self.pages)}
+
+        num_pages = len(self.pages)
+        self.out_degree = np.fromiter(
+            (len(corpus[page]) for page in self.pages),
+            dtype=np.int64, count=num_pages
+        )
+        self.indptr = np.zeros(num_pages + 1, dtype=np.int64)
+        np.cumsum(self.out_degree, out=self.indptr[1:])
+
+        index = self.index
+        self.indices = np.fromiter(
+            (index[link] for page in self.pages for link in corpus[page]),
+            dtype=np.int64, count=int(self.indptr[-1])
+        )
+
+        # Row of every stored link, so a sweep is a single weighted bincount
+        self.sources = np.repeat(np.arange(num_pages), self.out_degree)
+
+        # Pages without links pass on their rank by teleporting
+        self.dangling = self.out_degree == 0
+        self.out_weight = np.zeros(num_pages)
+        self.out_weight[~self.dangling] = 1 / self.out_degree[~self.dangling]
+
+    def __len__(self):
+        return len(self.pages)
+
+    def propagate(self, ranks):
+        """
+        Return the rank each page receives through links, given the
+        current `ranks`. Rank held by dangling pages is not included.
+
+        `ranks` is either a vector with one entry per page, or a matrix
+        with one rank vector per row, in which case each row is propagated
+        with its own weighted bincount over the compiled links. This is
+        several times faster than one bincount over the flattened matrix,
+        which would need index and weight arrays with an entry per link
+        for every row.
+        """
+        if ranks.ndim == 2:
+            received = np.empty(ranks.shape)
+            for row, vector in enumerate(ranks):
+                received[row] = self.propagate(vector)
+            return received
+
+        return np.bincount(
+            self.indices,
+            weights=(ranks * self.out_weight)[self.sources],
+            minlength=len(self.pages)
+        )
+
+    def to_dict(self, ranks):
+        """
+        Return a dictionary mapping each page name to its value in `ranks`.
+        """
+        return dict(zip(self.pages, ranks.tolist()))
+
+
+class SolverConfig():
+
+    NORMS = {
+        "l1": lambda difference: np.abs(difference).sum(axis=-1).max(),
+        "linf": lambda difference: np.abs(difference).max()
+    }
+    EXTRAPOLATIONS = (None, "aitken")
+
+    def __init__(self, tolerance=TOLERANCE, norm="l1",
+                 max_iterations=MAX_ITERATIONS, extrapolation=None,
+                 extrapolation_interval=10, callback=None):
+        """
+        Create settings for `power_iterate`.
+
+        Iteration stops once the change between sweeps, measured in `norm`
+        ("l1" or "linf"), drops below `tolerance`, or after `max_iterations`
+        sweeps. Set `extrapolation` to "aitken" to apply Aitken
+        extrapolation every `extrapolation_interval` sweeps; an extrapolation
+        that makes the following sweep worse is discarded. If given,
+        `callback(iteration, residual, seconds)` is called after every sweep.
+        """
+        if norm not in SolverConfig.NORMS:
+            raise ValueError(f"unknown norm {norm!r}")
+        if extrapolation not in SolverConfig.EXTRAPOLATIONS:
+            raise ValueError(f"unknown extrapolation {extrapolation!r}")
+        self.tolerance = tolerance
+        self.norm = norm
+        self.max_iterations = max_iterations
+        self.extrapolation = extrapolation
+        self.extrapolation_interval = extrapolation_interval
+        self.callback = callback
+
+    def residual(self, difference):
+        """
+        Return the size of `difference` in the configured norm; for a matrix
+        of rank vectors, return the size of its largest row.
+        """
+        return float(SolverConfig.NORMS[self.norm](difference))
+
+
+def aitken_extrapolate(previous2, previous, current):
+    """
+    Return an estimate of the limit of three successive iterates using
+    componentwise Aitken extrapolation, with each rank vector renormalized
+    to sum to 1.
+    """
+    step = previous - previous2
+    curvature = current - 2 * previous + previous2
+    estimate = current.copy()
+    safe = np.abs(curvature) > np.finfo(float).eps
+    estimate[safe] = previous2[safe] - step[safe] ** 2 / curvature[safe]
+    estimate = np.abs(estimate)
+    return estimate / estimate.sum(axis=-1, keepdims=True)
+
+
+def power_iterate(graph, damping_factor, config=None, trace=None,
+                  teleport=None):
+    """
+    Return the PageRank vector of a compiled `graph` by power iteration.
+
+    Every sweep is one sparse matrix-vector product plus the rank held by
+    dangling pages, which is redistributed the same way as teleports.
+    `config` is a `SolverConfig` controlling when iteration stops; if
+    `trace` is a list, a tuple `(iteration, residual, seconds)` is appended
+    to it after every sweep, with seconds counted from the start of the solve.
+
+    By default surfers teleport to any page with equal probability. To
+    solve personalized PageRank, pass `teleport` as a matrix with one row
+    per teleport distribution (see `teleport_matrix`); all rows are solved
+    together and a matrix with one rank vector per row is returned.
+    """
+    config = config or SolverConfig()
+    num_pages = len(graph)
+    if teleport is None:
+        teleport = np.full(num_pages, 1 / num_pages) # Even distribution
+    else:
+        teleport = np.asarray(teleport, dtype=float)
+    ranks = teleport.copy()
+    history = []
+    fallback = None
+    start = time.perf_counter()
+
+    for iteration in range(1, config.max_iterations + 1):
+        dangling_mass = ranks[..., graph.dangling].sum(axis=-1, keepdims=True)
+        new_ranks = (1 - damping_factor) * teleport + damping_factor * (
+            graph.propagate(ranks) + teleport * dangling_mass
+        )
+
+        residual = config.residual(new_ranks - ranks)
+
+        # Undo an extrapolation that made the next sweep worse
+        if fallback is not None:
+            if residual > fallback[1]:
+                new_ranks, residual = fallback
+                history = []
+            fallback = None
+
+        # Jump towards the limit using the last three iterates
+        if config.extrapolation == "aitken":
+            history = history[-1:] + [ranks]
+            if len(history) == 2 and iteration % config.extrapolation_interval == 0:
+                fallback = (new_ranks, residual)
+                new_ranks = aitken_extrapolate(*history, new_ranks)
+
+        ranks = new_ranks
+
+        seconds = time.perf_counter() - start
+        if trace is not None:
+            trace.append((iteration, residual, seconds))
+        if config.callback:
+            config.callback(iteration, residual, seconds)
+        if residual < config.tolerance:
+            break
+
+    return ranks / ranks.sum(axis=-1, keepdims=True)
+
+
+def iterate_pagerank(corpus, damping_factor, config=None):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
@@ -110,39 +497,342 @@ def iterate_pagerank(corpus, damping_factor):
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
-    num_pages = len(corpus)
-    pagerank = {page: 1 / num_pages for page in corpus} # Even initial distribution
-
-    while True:  
-        max_difference = 0  
-        for page in corpus:
-            new_rank = (1 - damping_factor) / num_pages
-
-            # Calculate contribution from incoming links 
-            linked_pages = [linked_page for linked_page, links in corpus.items() if page in links]
-            if linked_pages:
-                for linked_page in linked_pages:
-                    new_rank += damping_factor * pagerank[linked_page] / len(corpus[linked_page])   
-            else: # Handle dangling nodes (pages without links)
-                for other_page in corpus:
-                    new_rank += damping_factor * pagerank[other_page] / num_pages
-
-            # Update PageRank and track maximum change
-           
-            difference = pagerank[page] - new_rank
-            pagerank[page] = new_rank
-            max_difference = max(max_difference, difference)
-
-        # Check for convergence
-        if max_difference < 0.001: 
-            # Normalize PageRank scores
-            norm_sum = sum(pagerank.values())  
-            for page in pagerank:
-                pagerank[page] /= norm_sum  
-            break 
-
-        
-    return pagerank
+    graph = LinkGraph(corpus)
+    return graph.to_dict(power_iterate(graph, damping_factor, config))
+
+
+def teleport_matrix(graph, preferences):
+    """
+    Return a matrix of teleport distributions over the pages of `graph`,
+    one row per entry of `preferences`.
+
+    Each preference is either a dictionary mapping pages to weights, or
+    a collection of pages (a topic) to be weighted equally. Every row is
+    normalized to sum to 1.
+    """
+    teleport = np.zeros((len(preferences), len(graph)))
+    for row, preference in enumerate(preferences):
+        if not isinstance(preference, dict):
+            preference = dict.fromkeys(preference, 1)
+        for page, weight in preference.items():
+            teleport[row, graph.index[page]] = weight
+        total = teleport[row].sum()
+        if total <= 0:
+            raise ValueError(f"preference {row} has no positive weight")
+        teleport[row] /= total
+    return teleport
+
+
+def personalized_pagerank(graph, damping_factor, preferences, config=None):
+    """
+    Return a list of personalized PageRank dictionaries for a compiled
+    `graph`, one for each entry of `preferences` (see `teleport_matrix`).
+    All of them are solved together over the same link graph.
+    """
+    ranks = power_iterate(
+        graph, damping_factor, config,
+        teleport=teleport_matrix(graph, preferences)
+    )
+    return [graph.to_dict(row) for row in ranks]
+
+
+def partitioned_pagerank(graph, damping_factor, workers=None, config=None,
+                         trace=None):
+    """
+    Return the PageRank vector of a compiled `graph`, computed by `workers`
+    processes (one per core by default) that each own a slice of the pages.
+
+    Each worker holds the links into its own pages in shared memory. Every
+    superstep, workers read the previous rank vector (the contributions
+    from pages owned by other workers included), write the new ranks of
+    their own pages, and report their share of the residual and of the
+    rank held by dangling pages. The coordinating process then decides
+    whether to stop, as `power_iterate` would with the same `config` and
+    `trace`. Extrapolation is not supported in this mode.
+    """
+    config = config or SolverConfig()
+    if config.extrapolation:
+        raise ValueError("extrapolation is not supported when partitioned")
+    workers = workers or os.cpu_count() or 1
+    num_pages = len(graph)
+
+    # Sort links by the page they point to, so each worker owns a contiguous run
+    order = np.argsort(graph.indices, kind="stable")
+    in_indptr = np.zeros(num_pages + 1, dtype=np.int64)
+    np.cumsum(np.bincount(graph.indices, minlength=num_pages), out=in_indptr[1:])
+
+    # Split pages so every worker gets a similar number of pages plus links
+    work = in_indptr + np.arange(num_pages + 1)
+    bounds = np.searchsorted(work, np.linspace(0, work[-1], workers + 1))
+    bounds[0], bounds[-1] = 0, num_pages
+    bounds = np.unique(bounds)
+
+    arrays = {
+        "targets": graph.indices[order],
+        "sources": graph.sources[order],
+        "weights": graph.out_weight[graph.sources[order]],
+        "dangling": graph.dangling,
+        "ranks": np.full((2, num_pages), 1 / num_pages),
+        "partials": np.zeros((2, len(bounds) - 1))
+    }
+    shared = {}
+    processes = []
+    try:
+        for name, array in arrays.items():
+            memory = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+            view = np.ndarray(array.shape, array.dtype, buffer=memory.buf)
+            view[...] = array
+            shared[name] = (memory, view)
+        layout = {
+            name: (memory.name, view.shape, view.dtype.str)
+            for name, (memory, view) in shared.items()
+        }
+
+        # control holds the current buffer, dangling mass and stop flag
+        control = multiprocessing.Array("d", 3, lock=False)
+        barrier = multiprocessing.Barrier(len(bounds))
+        for worker in range(len(bounds) - 1):
+            pages = (int(bounds[worker]), int(bounds[worker + 1]))
+            links = (int(in_indptr[pages[0]]), int(in_indptr[pages[1]]))
+            process = multiprocessing.Process(
+                target=_partition_worker,
+                args=(layout, worker, pages, links, damping_factor,
+                      config.norm, control, barrier)
+            )
+            process.start()
+            processes.append(process)
+
+        # Break the barrier if a worker dies without reaching it
+        threading.Thread(
+            target=_watch_workers, args=(processes, barrier), daemon=True
+        ).start()
+
+        ranks = shared["ranks"][1]
+        partials = shared["partials"][1]
+        current = 0
+        control[1] = ranks[current][graph.dangling].sum()
+        start = time.perf_counter()
+
+        for iteration in range(1, config.max_iterations + 1):
+            control[0] = current
+            _superstep_wait(barrier) # Workers compute the next ranks
+            _superstep_wait(barrier)
+            current = 1 - current
+
+            residual = (partials[0].sum() if config.norm == "l1"
+                        else partials[0].max())
+            control[1] = partials[1].sum()
+
+            seconds = time.perf_counter() - start
+            if trace is not None:
+                trace.append((iteration, float(residual), seconds))
+            if config.callback:
+                config.callback(iteration, float(residual), seconds)
+            if residual < config.tolerance:
+                break
+
+        control[2] = 1
+        _superstep_wait(barrier)
+        for process in processes:
+            process.join()
+        result = ranks[current].copy()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for memory, _ in shared.values():
+            memory.close()
+            memory.unlink()
+
+    return result / result.sum()
+
+
+def _partition_worker(layout, worker, pages, links, damping_factor, norm,
+                      control, barrier):
+    """
+    Run supersteps of `partitioned_pagerank` for the pages in the range
+    `pages`, whose in-links are the range `links` of the shared link arrays.
+    """
+    memories = []
+    arrays = {}
+    for name, (memory_name, shape, dtype) in layout.items():
+        memory = shared_memory.SharedMemory(name=memory_name)
+        memories.append(memory)
+        arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=memory.buf)
+
+    first, last = pages
+    targets = arrays["targets"][links[0]:links[1]] - first
+    sources = arrays["sources"][links[0]:links[1]]
+    weights = arrays["weights"][links[0]:links[1]]
+    dangling = arrays["dangling"][first:last]
+    num_pages = arrays["ranks"].shape[1]
+    ranks = new_ranks = None
+
+    try:
+        while True:
+            barrier.wait()
+            if control[2]:
+                break
+            ranks = arrays["ranks"][int(control[0])]
+            new_ranks = arrays["ranks"][1 - int(control[0])][first:last]
+
+            received = np.bincount(
+                targets, weights=ranks[sources] * weights, minlength=last - first
+            )
+            new_ranks[:] = (1 - damping_factor) / num_pages + damping_factor * (
+                received + control[1] / num_pages
+            )
+
+            difference = np.abs(new_ranks - ranks[first:last])
+            arrays["partials"][0, worker] = (
+                difference.sum() if norm == "l1" else difference.max(initial=0)
+            )
+            arrays["partials"][1, worker] = new_ranks[dangling].sum()
+            barrier.wait()
+    except BaseException:
+        # Release the coordinator and other workers instead of leaving them waiting
+        barrier.abort()
+        raise
+    finally:
+        # Views must be released before the shared memory can be closed
+        del arrays, targets, sources, weights, dangling, ranks, new_ranks
+        for memory in memories:
+            memory.close()
+
+
+def _superstep_wait(barrier):
+    """
+    Wait at `barrier` for the partitioned PageRank workers, raising a
+    RuntimeError if one of them failed and broke the barrier.
+    """
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        raise RuntimeError("a partitioned PageRank worker failed") from None
+
+
+def _watch_workers(processes, barrier):
+    """
+    Abort `barrier` as soon as one of `processes` exits unsuccessfully, such
+    as when it is killed before it can abort the barrier itself.
+    """
+    running = list(processes)
+    while running:
+        for sentinel in wait([process.sentinel for process in running]):
+            process = next(p for p in running if p.sentinel == sentinel)
+            running.remove(process)
+            process.join()
+            if process.exitcode != 0:
+                barrier.abort()
+                return
+
+
+def update_pagerank(corpus, ranks, damping_factor, added_pages=None,
+                    removed_pages=(), added_links=(), removed_links=(),
+                    tolerance=TOLERANCE):
+    """
+    Return PageRank values for `corpus` after applying a change to it,
+    starting from its previous PageRank values `ranks`.
+
+    The change is given as a delta:
+        * `added_pages` maps each new page to the set of pages it links to,
+        * `removed_pages` lists pages to delete, along with links to them,
+        * `added_links` and `removed_links` list `(page, link)` pairs.
+    `corpus` is updated in place; `ranks` is left unchanged.
+
+    Rather than iterating over every page again, only the pages whose
+    links changed push the difference in the rank they pass on to the
+    pages they link to, and those pages push it further while it is above
+    `tolerance / len(corpus)`. Changes that affect every page equally
+    (the number of pages and the rank held by pages without links) only
+    rescale the result, so they are handled by the final normalization.
+    """
+    added_pages = added_pages or {}
+    removed_pages = set(removed_pages)
+    pagerank = dict(ranks)
+    old_size = len(corpus)
+
+    # Rank every page receives regardless of links, before the change
+    if added_pages:
+        dangling_mass = sum(
+            pagerank[page] for page, links in corpus.items() if not links
+        )
+        base_rank = (1 - damping_factor + damping_factor * dangling_mass) / old_size
+
+    # Remember the links of every page whose links are about to change
+    old_links = {}
+
+    def touch(page):
+        if page not in old_links:
+            old_links[page] = set(corpus[page]) if page in corpus else None
+
+    if removed_pages:
+        for page, links in corpus.items():
+            if page not in removed_pages and not links.isdisjoint(removed_pages):
+                touch(page)
+                links -= removed_pages
+        for page in removed_pages:
+            touch(page)
+            del corpus[page]
+
+    for page, links in added_pages.items():
+        touch(page)
+        corpus[page] = set(links)
+        pagerank.setdefault(page, 0)
+    for page, link in removed_links:
+        touch(page)
+        corpus[page].discard(link)
+    for page, link in added_links:
+        touch(page)
+        corpus[page].add(link)
+
+    # Only include links to other pages in the corpus
+    for page in old_links:
+        if page in corpus:
+            corpus[page] = set(
+                link for link in corpus[page]
+                if link in corpus and link != page
+            )
+
+    # Difference between the rank each page receives now and before
+    residual = {page: base_rank for page in added_pages if page not in ranks}
+    for page, links in old_links.items():
+        rank = pagerank.get(page, 0)
+        if links:
+            share = damping_factor * rank / len(links)
+            for link in links:
+                residual[link] = residual.get(link, 0) - share
+        if corpus.get(page):
+            share = damping_factor * rank / len(corpus[page])
+            for link in corpus[page]:
+                residual[link] = residual.get(link, 0) + share
+    for page in removed_pages:
+        residual.pop(page, None)
+        pagerank.pop(page, None)
+
+    # Push residuals along links until every one is below the threshold
+    threshold = tolerance / len(corpus)
+    queue = deque(page for page in residual if abs(residual[page]) > threshold)
+    while queue:
+        page = queue.popleft()
+        rank = residual[page]
+        if abs(rank) <= threshold:
+            continue
+        residual[page] = 0
+        pagerank[page] += rank
+
+        links = corpus[page]
+        if links: # Rank pushed from pages without links is spread evenly
+            share = damping_factor * rank / len(links)
+            for link in links:
+                before = residual.get(link, 0)
+                residual[link] = before + share
+                if abs(before) <= threshold < abs(before + share):
+                    queue.append(link)
+
+    # Normalize PageRank scores
+    norm_sum = sum(pagerank.values())
+    return {page: rank / norm_sum for page, rank in pagerank.items()}
 
 
 if __name__ == "__main__":